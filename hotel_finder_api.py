@@ -0,0 +1,467 @@
+"""飯店搜尋 HTTP JSON API（不需 Streamlit，可供其他服務呼叫）
+
+與 Streamlit 版共用同一份預先載入的 HotelDataset、地理編碼快取與距離計算引擎，
+每個請求只做篩選遮罩組合與空間索引查詢，不會重新執行任何 UI 程式碼。
+伺服器使用標準函式庫的 ThreadingHTTPServer：每個連線一個執行緒、HTTP/1.1 keep-alive。
+
+    python hotel_finder_api.py [--host 127.0.0.1] [--port 8000] [--csv hotel_with_latlng.csv]
+
+端點（GET 使用查詢字串，POST 使用 JSON 內容，參數相同）：
+- GET /search?place=台北車站&star=五星級&hot_spring=1&room_size=small&radius=10
+- GET /compare?place=台北車站&place=高雄車站&radius=10（也可用 places=台北車站,高雄車站）
+- GET /suggest?q=君悅&star=五星級&limit=10（飯店名稱 / 地址輸入即搜尋，依相符程度排列）
+- GET /clusters?zoom=12&bbox=24.9,121.4,25.2,121.7&star=五星級（地圖群集，bbox 為 南,西,北,東）
+- GET /health
+- GET /metrics（Prometheus 文字格式的各階段耗時）
+
+篩選參數與側邊欄相同：
+- star：標章（例如「五星級」），省略表示全部星級
+- hot_spring：1 / true / 是 表示只保留溫泉飯店
+- room_size：飯店規模代碼 small / medium / large / xlarge
+- radius：搜尋半徑（公里），預設 10
+- nearest：改為搜尋最近 N 間飯店（忽略 radius），可另以 max_km 指定最遠距離上限
+
+/clusters 由預先計算的各縮放層級網格聚合取出 bbox 內的群集與單點，
+回傳筆數有上限（見 hotel_finder_clusters），地圖前端可在每次移動或縮放後呼叫。
+
+伺服器每 --reload-interval 秒檢查一次資料檔版本，資料更新後在背景載入新版資料集再替換，
+進行中的請求繼續使用原本的資料集。
+"""
+import argparse
+import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+from geopy.geocoders import Nominatim
+
+from hotel_finder_clusters import MAX_ZOOM, MIN_ZOOM, label_features
+from hotel_finder_dataset import HotelDataset, dataset_version, validation_summary
+from hotel_finder_filters import ROOM_SIZE_LABELS
+from hotel_finder_geocode import (
+    GeocodeCache, GeocodeScheduler, Geocoder, RateLimiter,
+    load_gazetteer, nominatim_resolver, rate_limited,
+)
+from hotel_finder_metrics import METRICS, PROMETHEUS_CONTENT_TYPE, stage_timer
+from hotel_finder_search import (
+    SearchResultCache, comparison_stats, search_location, search_locations,
+    search_nearest, search_nearest_many, search_text,
+)
+
+CSV_FILE = "hotel_with_latlng.csv"
+DEFAULT_RADIUS_KM = 10
+MAX_RADIUS_KM = 50
+MAX_COMPARE_PLACES = 20
+MAX_NEAREST = 100
+DEFAULT_SUGGESTIONS = 10
+MAX_SUGGESTIONS = 50
+MAX_BODY_BYTES = 64 * 1024
+TRUE_VALUES = {"1", "true", "yes", "on", "是"}
+
+
+def _records(frame):
+    """DataFrame → JSON 可序列化的資料列（缺值轉為 null）"""
+    return frame.astype(object).where(frame.notna(), None).to_dict('records')
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def _first(params, name, default=None):
+    values = params.get(name)
+    if not values:
+        return default
+    return values[0]
+
+
+class HotelSearchService:
+    """API 的搜尋邏輯（不含 HTTP），可直接在程式或測試中呼叫
+
+    geocoder 只需提供 geocode(address) 方法，測試時可換成離線的替身。
+    """
+
+    def __init__(self, dataset, geocoder, scheduler=None, result_cache=None):
+        self.dataset = dataset
+        self.geocoder = geocoder
+        self.scheduler = scheduler or GeocodeScheduler(geocoder)
+        self.result_cache = result_cache or SearchResultCache()
+
+    def parse_filters(self, params):
+        """解析篩選參數，不合法時拋出 ValueError"""
+        star = _first(params, "star") or None
+        if star is not None and star not in self.dataset.filters.marks:
+            raise ValueError(f"未知的星級標章：{star}")
+        room_size = _first(params, "room_size") or None
+        if room_size is not None and room_size not in ROOM_SIZE_LABELS:
+            raise ValueError(f"room_size 必須是 {' / '.join(ROOM_SIZE_LABELS)}")
+        hot_spring = str(_first(params, "hot_spring", "")).strip().lower() in TRUE_VALUES
+        try:
+            radius = float(_first(params, "radius", DEFAULT_RADIUS_KM))
+        except (TypeError, ValueError):
+            raise ValueError("radius 必須是數字") from None
+        if not math.isfinite(radius) or not 0 < radius <= MAX_RADIUS_KM:
+            raise ValueError(f"radius 必須介於 0 到 {MAX_RADIUS_KM} 公里")
+        nearest = _first(params, "nearest") or None
+        max_km = _first(params, "max_km") or None
+        try:
+            nearest = int(nearest) if nearest is not None else None
+            max_km = float(max_km) if max_km is not None else None
+        except ValueError:
+            raise ValueError("nearest 必須是整數、max_km 必須是數字") from None
+        if nearest is not None and not 1 <= nearest <= MAX_NEAREST:
+            raise ValueError(f"nearest 必須介於 1 到 {MAX_NEAREST}")
+        if max_km is not None and (not math.isfinite(max_km) or max_km <= 0):
+            raise ValueError("max_km 必須是大於 0 的有限數字")
+        return {"star": star, "hot_spring": hot_spring, "room_size": room_size, "radius": radius,
+                "nearest": nearest, "max_km": max_km}
+
+    def filter_mask(self, filters, dataset=None):
+        dataset = dataset or self.dataset
+        with stage_timer("filter", "api"):
+            return dataset.filters.compose(
+                star=filters["star"],
+                hot_spring=filters["hot_spring"],
+                room_size=filters["room_size"],
+            )
+
+    def search(self, params):
+        """單地點搜尋，回傳 (HTTP 狀態碼, 回應內容)"""
+        place = (_first(params, "place") or "").strip()
+        if not place:
+            raise ValueError("缺少 place 參數")
+        filters = self.parse_filters(params)
+        try:
+            with stage_timer("geocode", "api"):
+                loc = self.geocoder.geocode(place)
+        except Exception as e:
+            return 502, {"error": f"地理編碼時發生錯誤：{e}"}
+        if loc is None:
+            return 404, {"error": "查無此地點", "place": place}
+        nearest = filters["nearest"]
+        # 整個請求使用同一份資料集，期間資料集被替換也不受影響
+        dataset = self.dataset
+
+        def compute():
+            mask = self.filter_mask(filters, dataset)
+            with stage_timer("distance", "api"):
+                if nearest:
+                    return search_nearest(dataset, loc, mask, nearest, max_km=filters["max_km"])
+                return search_location(dataset, loc, mask, filters["radius"])
+
+        filter_key = (filters["star"], filters["hot_spring"], filters["room_size"])
+        if nearest:
+            key = self.result_cache.key(loc, filter_key, filters["max_km"] or 0, "nearest", nearest)
+        else:
+            key = self.result_cache.key(loc, filter_key, filters["radius"])
+        hotels = self.result_cache.lookup(dataset.version, key, compute)
+        return 200, {
+            "place": place,
+            "location": list(loc),
+            "filters": filters,
+            "count": len(hotels),
+            "hotels": _records(hotels),
+        }
+
+    def compare(self, params):
+        """多地點比較：同時地理編碼，再以一次距離矩陣搜尋所有地點"""
+        places = [
+            name.strip()
+            for value in params.get("place", []) + params.get("places", [])
+            for name in str(value).split(",")
+            if name.strip()
+        ]
+        places = list(dict.fromkeys(places))
+        if len(places) < 2:
+            raise ValueError("至少需要 2 個地點")
+        if len(places) > MAX_COMPARE_PLACES:
+            raise ValueError(f"最多比較 {MAX_COMPARE_PLACES} 個地點")
+        filters = self.parse_filters(params)
+
+        location_coords, errors = {}, {}
+        with stage_timer("geocode", "api"):
+            for place, loc, error in self.scheduler.geocode_many(places):
+                location_coords[place] = loc
+                if error is not None:
+                    errors[place] = f"地理編碼時發生錯誤：{error}"
+        location_coords = {place: location_coords[place] for place in places}
+
+        dataset = self.dataset
+
+        def compute():
+            mask = self.filter_mask(filters, dataset)
+            with stage_timer("distance", "api"):
+                if filters["nearest"]:
+                    return search_nearest_many(dataset, location_coords, mask,
+                                               filters["nearest"], max_km=filters["max_km"])
+                return search_locations(dataset, location_coords, mask, filters["radius"])
+
+        filter_key = (filters["star"], filters["hot_spring"], filters["room_size"])
+        if filters["nearest"]:
+            key = self.result_cache.key_many(location_coords, filter_key, filters["max_km"] or 0,
+                                             "nearest", filters["nearest"])
+        else:
+            key = self.result_cache.key_many(location_coords, filter_key, filters["radius"])
+        hits = self.result_cache.lookup(dataset.version, key, compute)
+        with stage_timer("stats", "api"):
+            stats = comparison_stats(location_coords, hits).set_index("地點")
+        hits_by_place = dict(tuple(hits.groupby('搜尋地點', sort=False)))
+        locations = []
+        for place in places:
+            loc = location_coords[place]
+            entry = {"place": place, "location": list(loc) if loc is not None else None}
+            if loc is None:
+                entry["error"] = errors.get(place, "查無此地點")
+            row = stats.loc[place]
+            entry["stats"] = {
+                "飯店總數": int(row["飯店總數"]),
+                "五星飯店": int(row["五星飯店"]),
+                "溫泉飯店": int(row["溫泉飯店"]),
+                "平均距離": float(row["平均距離"]) if row["飯店總數"] else None,
+                "最近距離": float(row["最近距離"]) if row["飯店總數"] else None,
+            }
+            place_hits = hits_by_place.get(place)
+            entry["hotels"] = [] if place_hits is None else _records(place_hits.drop(columns='搜尋地點'))
+            locations.append(entry)
+        return 200, {"filters": filters, "locations": locations}
+
+    def suggest(self, params):
+        """名稱 / 地址搜尋（n-gram 索引），套用星級、規模與溫泉篩選"""
+        query = (_first(params, "q") or "").strip()
+        if not query:
+            raise ValueError("缺少 q 參數")
+        try:
+            limit = int(_first(params, "limit", DEFAULT_SUGGESTIONS))
+        except ValueError:
+            raise ValueError("limit 必須是整數") from None
+        if not 1 <= limit <= MAX_SUGGESTIONS:
+            raise ValueError(f"limit 必須介於 1 到 {MAX_SUGGESTIONS}")
+        filters = self.parse_filters(params)
+
+        dataset = self.dataset
+        mask = self.filter_mask(filters, dataset)
+        with stage_timer("text", "api"):
+            hotels = search_text(dataset, query, mask, limit=limit)
+        return 200, {"query": query, "count": len(hotels), "hotels": _records(hotels)}
+
+    def clusters(self, params):
+        """地圖群集：bbox（南,西,北,東）內的群集與單點"""
+        try:
+            zoom = float(_first(params, "zoom"))
+            bbox = [float(value) for value in str(_first(params, "bbox")).split(",")]
+        except (TypeError, ValueError):
+            raise ValueError("zoom 必須是數字、bbox 必須是「南,西,北,東」四個數字") from None
+        if len(bbox) != 4 or not all(math.isfinite(value) for value in bbox):
+            raise ValueError("bbox 必須是「南,西,北,東」四個數字")
+        south, west, north, east = bbox
+        if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+            raise ValueError("bbox 範圍不正確")
+        if not math.isfinite(zoom) or not MIN_ZOOM <= zoom <= MAX_ZOOM + 6:
+            raise ValueError(f"zoom 必須介於 {MIN_ZOOM} 到 {MAX_ZOOM + 6}")
+        filters = self.parse_filters(params)
+
+        dataset = self.dataset
+        mask = self.filter_mask(filters, dataset)
+        filter_key = (filters["star"], filters["hot_spring"], filters["room_size"])
+        with stage_timer("map", "api"):
+            features, level = dataset.clusters.query(zoom, bbox, mask, filter_key)
+            features = label_features(features, dataset.frame)
+        single = features['position'] >= 0
+        return 200, {
+            "zoom": zoom,
+            "level": level,
+            "bbox": bbox,
+            "clusters": _records(features.loc[~single, ['lat', 'lng', 'count']]),
+            "hotels": _records(features.loc[single, ['lat', 'lng', 'label']]),
+        }
+
+    def health(self, params):
+        dataset = self.dataset
+        return 200, {
+            "status": "ok",
+            "hotels": len(dataset),
+            "dataset_version": dataset.version,
+            "validation": dataset.validation,
+            "result_cache": self.result_cache.stats(),
+        }
+
+
+class HotelAPIRequestHandler(BaseHTTPRequestHandler):
+    """JSON 請求處理：HTTP/1.1 持續連線，每個回應都帶 Content-Length"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "HotelFinderAPI/1.0"
+    # 小型 JSON 回應不等待 Nagle 合併封包，降低 keep-alive 連線上的延遲
+    disable_nagle_algorithm = True
+
+    routes = {
+        "/search": HotelSearchService.search,
+        "/compare": HotelSearchService.compare,
+        "/suggest": HotelSearchService.suggest,
+        "/clusters": HotelSearchService.clusters,
+        "/health": HotelSearchService.health,
+    }
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/metrics":
+            self.send_body(200, METRICS.prometheus_text().encode("utf-8"), PROMETHEUS_CONTENT_TYPE)
+            return
+        self.dispatch(url.path, parse_qs(url.query))
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # rfile.read(-1) 會一直等到連線關閉，不合法的長度直接拒絕
+            self.close_connection = True
+            self.send_json(400, {"error": "Content-Length 不正確"})
+            return
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            self.send_json(413, {"error": "請求內容過大"})
+            return
+        body = self.rfile.read(length) if length else b"{}"
+        try:
+            payload = json.loads(body or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError
+        except ValueError:
+            self.send_json(400, {"error": "請求內容必須是 JSON 物件"})
+            return
+        # 轉為與查詢字串相同的 {名稱: [值, ...]} 形式
+        params = {
+            name: [str(v) for v in value] if isinstance(value, list) else [str(value)]
+            for name, value in payload.items()
+            if value is not None
+        }
+        self.dispatch(url.path, params)
+
+    def dispatch(self, path, params):
+        route = self.routes.get(path.rstrip("/") or "/")
+        if route is None:
+            self.send_json(404, {"error": f"找不到路徑：{path}"})
+            return
+        try:
+            status, payload = route(self.server.service, params)
+        except ValueError as e:
+            status, payload = 400, {"error": str(e)}
+        except Exception as e:
+            self.log_error("處理 %s 時發生錯誤：%r", path, e)
+            status, payload = 500, {"error": "伺服器內部錯誤"}
+        self.send_json(status, payload)
+
+    def send_json(self, status, payload):
+        with stage_timer("render", "api"):
+            try:
+                # 輸出標準 JSON：NaN / Infinity 不是合法的 JSON 值，出現時視為伺服器錯誤而不是照樣輸出
+                body = json.dumps(payload, ensure_ascii=False, allow_nan=False, default=_json_default)
+            except ValueError as e:
+                self.log_error("輸出 JSON 時發生錯誤：%r", e)
+                status, body = 500, json.dumps({"error": "伺服器內部錯誤"}, ensure_ascii=False)
+        self.send_body(status, body.encode("utf-8"), "application/json; charset=utf-8")
+
+    def send_body(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class HotelAPIServer(ThreadingHTTPServer):
+    """每個連線一個 daemon 執行緒，所有執行緒共用同一個 HotelSearchService"""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, service, verbose=False):
+        super().__init__(address, HotelAPIRequestHandler)
+        self.service = service
+        self.verbose = verbose
+
+
+def load_geocoder():
+    """API 使用的地理編碼器（離線地名表、持久化快取、節流的 Nominatim）"""
+    geolocator = Nominatim(user_agent="hotel_finder_api")
+    resolver = rate_limited(nominatim_resolver(geolocator, suffix=", Taiwan"), RateLimiter())
+    return Geocoder(load_gazetteer(), GeocodeCache(), resolver)
+
+
+def load_dataset(csv_path=CSV_FILE):
+    with stage_timer("load", "api"):
+        dataset = HotelDataset.from_csv(csv_path)
+        # /suggest 使用的名稱地址索引與 /clusters 預設篩選條件（全部星級飯店）的各層級群集
+        # 在載入時先建立，第一個請求不必等待；其他篩選條件第一次查詢時建立
+        dataset.text
+        dataset.clusters.levels(dataset.filters.compose(), (None, False, None))
+        return dataset
+
+
+def watch_dataset(service, csv_path=CSV_FILE, interval=30.0):
+    """背景執行緒：資料檔版本改變時載入新版資料集並替換 service.dataset"""
+    def watch():
+        while True:
+            time.sleep(interval)
+            try:
+                if dataset_version(csv_path) != service.dataset.version:
+                    service.dataset = load_dataset(csv_path)
+                    print(f"已載入新版資料集：{len(service.dataset)} 筆飯店（{service.dataset.version}）")
+            except Exception as e:
+                print(f"重新載入資料集失敗：{e}")
+
+    thread = threading.Thread(target=watch, name="dataset-watch", daemon=True)
+    thread.start()
+    return thread
+
+
+def make_server(dataset, geocoder, host="127.0.0.1", port=8000, verbose=False):
+    """建立 API 伺服器；port 為 0 時由系統指定可用埠號（server.server_address）"""
+    return HotelAPIServer((host, port), HotelSearchService(dataset, geocoder), verbose=verbose)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="台灣星級飯店搜尋 HTTP JSON API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--csv", default=CSV_FILE, help="飯店資料 CSV（同名 .feather 資料檔優先）")
+    parser.add_argument("--verbose", action="store_true", help="輸出每個請求的存取紀錄")
+    parser.add_argument("--reload-interval", type=float, default=30.0,
+                        help="檢查資料檔是否更新的間隔秒數（0 表示不檢查）")
+    args = parser.parse_args(argv)
+
+    # 資料集載入與地理編碼器初始化同時進行
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        dataset_future = executor.submit(load_dataset, args.csv)
+        geocoder_future = executor.submit(load_geocoder)
+        dataset, geocoder = dataset_future.result(), geocoder_future.result()
+
+    server = make_server(dataset, geocoder, args.host, args.port, verbose=args.verbose)
+    if args.reload_interval > 0:
+        watch_dataset(server.service, args.csv, args.reload_interval)
+    host, port = server.server_address[:2]
+    print(f"飯店搜尋 API 已啟動：http://{host}:{port}（{len(dataset)} 筆飯店）")
+    print(validation_summary(dataset.validation))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""離線批次搜尋：為大量地址找出附近的星級飯店
+
+讀取地址清單（CSV 的「地點」/「地址」欄或每行一個地址的 TXT），
+以離線地名表與地理編碼快取解析座標（加上 --online 才會查詢 Nominatim），
+距離計算分批交給多個行程平行執行，每批完成後立即寫入輸出檔：
+
+    python hotel_finder_batch.py customers.csv --output nearest.csv --nearest 10
+    python hotel_finder_batch.py customers.txt --output nearest.parquet --radius 5 --workers 4
+
+- 輸出為長表：每個地址的每間飯店一列，含「搜尋地點」、「狀態」、「名次」與飯店欄位；
+  查無地點或範圍內沒有飯店的地址也會寫入一列狀態，方便核對
+- CSV 以 UTF-8 BOM 逐批附加；.parquet 輸出為資料夾，每批一個 part 檔
+- 中斷後以相同參數重新執行即可接續：已寫入的地址會略過；CSV 最後一個地址可能只寫入一部分，
+  接續時移除該地址的列並重新搜尋
+- 「查無地點」不算完成：重新執行（例如加上 --online）時先移除這些列再重新地理編碼，
+  重試的地址附加在輸出檔最後；地理編碼失敗（例如網路錯誤）的地址不寫入，下次執行時重試
+- 執行中回報已處理地址數與每秒處理地址數
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from hotel_finder_dataset import HotelDataset
+from hotel_finder_engine import build_hotel_frame
+from hotel_finder_filters import ROOM_SIZE_LABELS
+from hotel_finder_geocode import (
+    GeocodeCache, Geocoder, RateLimiter, geocode_each, load_gazetteer, nominatim_resolver,
+    rate_limited,
+)
+from hotel_finder_search import read_place_list, search_locations, search_nearest_many
+
+CSV_FILE = "hotel_with_latlng.csv"
+DEFAULT_NEAREST = 10
+DEFAULT_CHUNK_SIZE = 500
+
+STATUS_FOUND = "完成"
+STATUS_NOT_FOUND = "查無地點"
+STATUS_EMPTY = "範圍內無飯店"
+
+# 每個工作行程各自載入一份資料集（記憶體映射的資料檔），只在初始化時建立
+_worker = {}
+
+
+def _init_worker(csv_path, filters, nearest, radius_km, max_km):
+    dataset = HotelDataset.from_csv(csv_path)
+    _worker.update(
+        dataset=dataset,
+        mask=dataset.filters.compose(**filters),
+        nearest=nearest,
+        radius_km=radius_km,
+        max_km=max_km,
+    )
+
+
+def _search_chunk(located):
+    """在工作行程中搜尋一批地址；located 為 [(地址, 座標或 None)]"""
+    dataset, mask = _worker["dataset"], _worker["mask"]
+    location_coords = dict(located)
+    if _worker["nearest"]:
+        hits = search_nearest_many(dataset, location_coords, mask,
+                                   _worker["nearest"], max_km=_worker["max_km"])
+    else:
+        hits = search_locations(dataset, location_coords, mask, _worker["radius_km"])
+    empty = build_hotel_frame(dataset.frame, np.empty(0, dtype=np.int64), np.empty(0))
+    return format_results(located, hits, empty)
+
+
+def format_results(located, hits, empty):
+    """整理成輸出長表：依輸入順序排列，沒有結果的地址補一列狀態
+
+    empty 為 0 列的飯店資料表，用來讓狀態列的欄位型別與飯店列一致。
+    """
+    ranked = hits.drop(columns='搜尋地點').assign(
+        搜尋地點=hits['搜尋地點'].to_numpy(dtype=object),
+        狀態=STATUS_FOUND,
+        名次=hits.groupby('搜尋地點', sort=False).cumcount().to_numpy() + 1,
+    )
+    found = set(ranked['搜尋地點'])
+    missing = [(place, STATUS_NOT_FOUND if loc is None else STATUS_EMPTY)
+               for place, loc in located if place not in found]
+    status_rows = empty.reindex(range(len(missing))).assign(
+        搜尋地點=np.array([place for place, _ in missing], dtype=object),
+        狀態=[status for _, status in missing],
+        名次=0,
+    )
+    frame = pd.concat([ranked, status_rows], ignore_index=True)
+    order = {place: i for i, (place, _) in enumerate(located)}
+    frame = frame.iloc[np.argsort(frame['搜尋地點'].map(order).to_numpy(), kind='stable')]
+    frame['名次'] = frame['名次'].astype('Int64').mask(frame['名次'] == 0)
+    leading = ['搜尋地點', '狀態', '名次']
+    return frame[leading + [column for column in frame.columns if column not in leading]]
+
+
+def finished_rows(frame, drop_last=False):
+    """接續時仍視為完成的列（布林陣列）
+
+    「查無地點」的地址下次重試；drop_last 時最後一個地址可能只寫入一部分，也重新搜尋。
+    """
+    keep = frame['狀態'].to_numpy(dtype=object) != STATUS_NOT_FOUND
+    if drop_last and len(frame):
+        places = frame['搜尋地點'].to_numpy(dtype=object)
+        keep &= places != places[-1]
+    return keep
+
+
+class CsvResultWriter:
+    """逐批附加寫入 CSV（UTF-8 BOM），可接續先前中斷的輸出檔"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def completed(self):
+        """已完成的地址
+
+        先截掉中斷時寫到一半的最後一列，再移除最後一個地址（可能只寫入部分飯店）
+        與「查無地點」的列（先寫暫存檔再換名），這些地址會重新搜尋。
+        """
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return set()
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            f.truncate(data.rfind(b"\n") + 1)
+        if os.path.getsize(self.path) == 0:
+            return set()
+        done = pd.read_csv(self.path, encoding="utf-8-sig", dtype=str, keep_default_na=False)
+        keep = finished_rows(done, drop_last=True)
+        if not keep.all():
+            tmp_path = self.path + ".tmp"
+            done[keep].to_csv(tmp_path, index=False, encoding="utf-8-sig")
+            os.replace(tmp_path, self.path)
+        return set(done.loc[keep, '搜尋地點'])
+
+    def write(self, frame):
+        header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        text = frame.to_csv(index=False, header=header)
+        with open(self.path, "a", encoding="utf-8", newline="") as f:
+            f.write(("\ufeff" if header else "") + text)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class ParquetResultWriter:
+    """每批寫成資料夾內的一個 part 檔（先寫暫存檔再改名，中斷時不會留下半個檔案）"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.parts = sorted(name for name in os.listdir(path) if name.endswith(".parquet"))
+
+    def completed(self):
+        """已完成的地址；part 檔是整批寫入的，只需移除「查無地點」的列（改寫該 part 檔）"""
+        done = set()
+        for name in self.parts:
+            path = os.path.join(self.path, name)
+            status = pd.read_parquet(path, columns=['搜尋地點', '狀態'])
+            keep = finished_rows(status)
+            if not keep.all():
+                tmp_path = path + ".tmp"
+                pd.read_parquet(path)[keep].to_parquet(tmp_path, index=False)
+                os.replace(tmp_path, path)
+            done.update(status.loc[keep, '搜尋地點'])
+        return done
+
+    def write(self, frame):
+        name = f"part-{len(self.parts):05d}.parquet"
+        tmp_path = os.path.join(self.path, name + ".tmp")
+        frame.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, os.path.join(self.path, name))
+        self.parts.append(name)
+
+
+def result_writer(path):
+    if path.lower().endswith(".parquet"):
+        return ParquetResultWriter(path)
+    return CsvResultWriter(path)
+
+
+def run_batch(places, geocode, writer, csv_path=CSV_FILE, filters=None, nearest=DEFAULT_NEAREST,
+              radius_km=None, max_km=None, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+              report=print):
+    """批次搜尋並逐批寫入 writer，回傳統計 dict
+
+    每批地址在主行程地理編碼後交給行程池計算距離；同時進行中的批次數限制為 workers 的兩倍，
+    依送出順序寫入，因此輸出檔中的地址順序與輸入相同。
+    """
+    done = writer.completed()
+    pending = [place for place in places if place not in done]
+    if done:
+        report(f"接續先前的輸出：略過 {len(places) - len(pending):,} 個已完成的地址")
+    workers = workers or os.cpu_count() or 1
+    stats = {"addresses": 0, "rows": 0, "failed": [], "skipped": len(places) - len(pending)}
+    start = time.perf_counter()
+
+    def drain(in_flight):
+        size, future = in_flight.popleft()
+        frame = future.result()
+        writer.write(frame)
+        stats["addresses"] += size
+        stats["rows"] += len(frame)
+        elapsed = time.perf_counter() - start
+        report(f"已處理 {stats['addresses']:,} / {len(pending):,} 個地址，"
+               f"{stats['addresses'] / elapsed:,.0f} 個地址/秒")
+
+    initargs = (csv_path, filters or {}, nearest, radius_km, max_km)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool, \
+            ThreadPoolExecutor(max_workers=8, thread_name_prefix="geocode") as geocode_pool:
+        in_flight = deque()
+        for offset in range(0, len(pending), chunk_size):
+            located, failed = geocode_each(pending[offset:offset + chunk_size], geocode, geocode_pool)
+            stats["failed"].extend(failed)
+            if located:
+                in_flight.append((len(located), pool.submit(_search_chunk, located)))
+            while len(in_flight) > workers * 2:
+                drain(in_flight)
+        while in_flight:
+            drain(in_flight)
+
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批次搜尋大量地址附近的星級飯店")
+    parser.add_argument("input", help="地址清單（CSV 的「地點」/「地址」欄，或每行一個地址的 TXT）")
+    parser.add_argument("--output", required=True, help="輸出檔（.csv，或 .parquet 資料夾）")
+    parser.add_argument("--csv", default=CSV_FILE, help="飯店資料 CSV（同名 .feather 資料檔優先）")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--nearest", type=int, default=DEFAULT_NEAREST, help="每個地址取最近 N 間飯店")
+    mode.add_argument("--radius", type=float, help="改為搜尋半徑（公里）內所有飯店")
+    parser.add_argument("--max-km", type=float, help="最近 N 間模式的最遠距離上限（公里）")
+    parser.add_argument("--star", help="星級標章，例如 五星級")
+    parser.add_argument("--hot-spring", action="store_true", help="只搜尋溫泉飯店")
+    parser.add_argument("--room-size", choices=list(ROOM_SIZE_LABELS), help="飯店規模")
+    parser.add_argument("--workers", type=int, help="距離計算行程數（預設為 CPU 核心數）")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="每批地址數")
+    parser.add_argument("--online", action="store_true",
+                        help="離線地名表與快取都查不到時查詢 Nominatim（受每秒請求數限制）")
+    args = parser.parse_args(argv)
+
+    # 先在主行程載入一次：檢查參數並建好資料檔，工作行程只需記憶體映射讀取
+    dataset = HotelDataset.from_csv(args.csv)
+    if args.star is not None and args.star not in dataset.filters.marks:
+        parser.error(f"未知的星級標章：{args.star}")
+    if args.radius is not None and args.radius <= 0:
+        parser.error("--radius 必須大於 0")
+    if args.nearest is not None and args.nearest < 1:
+        parser.error("--nearest 必須大於 0")
+    if args.output.lower().endswith(".parquet"):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error("輸出 Parquet 需要安裝 pyarrow")
+
+    with open(args.input, "rb") as f:
+        places = read_place_list(f.read(), args.input)
+
+    resolver = None
+    if args.online:
+        from geopy.geocoders import Nominatim
+        resolver = rate_limited(
+            nominatim_resolver(Nominatim(user_agent="hotel_finder_batch"), suffix=", Taiwan"),
+            RateLimiter(),
+        )
+    geocoder = Geocoder(load_gazetteer(), GeocodeCache(), resolver)
+    geocode = geocoder.geocode if args.online else geocoder.geocode_offline
+
+    stats = run_batch(
+        places, geocode, result_writer(args.output), csv_path=args.csv,
+        filters={"star": args.star, "hot_spring": args.hot_spring, "room_size": args.room_size},
+        nearest=None if args.radius is not None else args.nearest, radius_km=args.radius,
+        max_km=args.max_km, workers=args.workers, chunk_size=args.chunk_size,
+    )
+
+    rate = stats["addresses"] / stats["seconds"] if stats["seconds"] else 0.0
+    print(f"完成：{stats['addresses']:,} 個地址、{stats['rows']:,} 列結果，"
+          f"耗時 {stats['seconds']:.1f} 秒（{rate:,.0f} 個地址/秒），已寫入 {args.output}")
+    if stats["failed"]:
+        print(f"{len(stats['failed']):,} 個地址地理編碼失敗，重新執行相同指令即可重試")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+"""效能基準測試：以合成的全國旅宿資料測量各階段耗時
+
+依 hotel_with_latlng.csv 的欄位格式產生 1k / 10k / 100k / 1M 筆合成資料：
+- 座標以實際飯店位置為中心加上常態分布偏移（標準差約 3 公里），限制在台灣範圍內
+- 標章依全國旅宿的大致比例產生（多數旅館沒有星級標章）
+- 房間數依是否為星級飯店取不同的對數常態分布
+
+測量階段：讀取 CSV、建置 / 載入欄式資料檔、建立索引、篩選、半徑搜尋、
+最近 N 間搜尋、名稱 / 地址搜尋、多地點比較、CSV / GeoJSON 匯出。地理編碼使用離線地名表與固定座標的替身，
+不會連線 Nominatim。結果寫入 JSON 檔，可用 --baseline 與先前版本比較找出效能退步：
+
+    python hotel_finder_benchmark.py --sizes 1000 10000 --output benchmark_results.json
+    python hotel_finder_benchmark.py --baseline old.json --threshold 1.25
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from hotel_finder_dataset import (
+    HotelDataset, build_dataset_artifact, load_hotel_dataframe, read_hotel_csv,
+)
+from hotel_finder_export import export_file
+from hotel_finder_geocode import GeocodeCache, Geocoder, HOTEL_CSV_FILE, load_gazetteer
+from hotel_finder_search import comparison_stats, search_location, search_locations, search_nearest
+from hotel_finder_text import TextIndex
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_OUTPUT = "benchmark_results.json"
+
+# 耗時低於此值（毫秒）的階段受計時誤差影響太大，不列入退步判斷
+REGRESSION_FLOOR_MS = 0.1
+
+# 台灣本島與離島的經緯度範圍
+TAIWAN_BOUNDS = {"lat": (21.8, 26.4), "lng": (118.1, 122.1)}
+
+# 全國旅宿的標章分布（空字串表示沒有星級標章）
+MARK_WEIGHTS = {
+    "": 0.88, "五星級": 0.035, "四星級": 0.03, "三星級": 0.03,
+    "二星級": 0.01, "一星級": 0.005, "卓越五星": 0.005, "星級旅館": 0.005,
+}
+
+# 多地點比較使用的地名（皆收錄於離線地名表）
+COMPARE_PLACES = ["臺北市", "臺中市", "高雄市", "花蓮縣", "宜蘭縣"]
+
+# 單點搜尋的查詢地點（直接給座標，不經地理編碼）
+QUERY_POINTS = [(25.0478, 121.5170), (24.1372, 120.6869), (22.6394, 120.3025), (23.9769, 121.6044)]
+
+# 名稱 / 地址搜尋的查詢字串
+TEXT_QUERIES = ["福華", "溫泉會館", "中山路", "臺北 晶華", "捷絲旅"]
+
+NAME_PREFIXES = np.array(["福華", "國賓", "晶華", "長榮", "老爺", "福容", "麗緻", "統一", "君悅", "寒舍",
+                          "華泰", "凱撒", "天成", "和逸", "煙波", "雲品", "承億", "富驛", "捷絲旅", "薆悅"])
+NAME_SUFFIXES = np.array(["大飯店", "酒店", "商旅", "旅館", "渡假村", "溫泉會館", "行館", "飯店"])
+ROADS = np.array(["中山路", "中正路", "民生路", "民權路", "復興路", "光復路", "成功路", "和平路", "忠孝路", "仁愛路"])
+
+
+def _column(values):
+    return pd.Series(values).astype(str)
+
+
+def generate_registry(rows, seed=0, template_csv=HOTEL_CSV_FILE):
+    """產生 rows 筆與 hotel_with_latlng.csv 相同欄位的合成旅宿資料"""
+    rng = np.random.default_rng(seed)
+    template = pd.read_csv(template_csv, encoding="utf-8")
+    anchors = rng.integers(0, len(template), rows)
+    anchor = template.iloc[anchors].reset_index(drop=True)
+
+    marks = rng.choice(list(MARK_WEIGHTS), size=rows, p=list(MARK_WEIGHTS.values()))
+    starred = marks != ""
+    categories = np.where(
+        starred,
+        rng.choice(["國際觀光旅館", "一般觀光旅館", "旅館"], size=rows, p=[0.45, 0.15, 0.4]),
+        rng.choice(["旅館", "民宿"], size=rows, p=[0.7, 0.3]),
+    )
+    rooms = np.where(starred, rng.lognormal(np.log(215), 0.5, rows), rng.lognormal(np.log(30), 0.8, rows))
+    lat = anchor['lat'].to_numpy() + rng.normal(0.0, 0.03, rows)
+    lng = anchor['lng'].to_numpy() + rng.normal(0.0, 0.03, rows)
+    ids = _column(np.arange(1, rows + 1))
+    numbers = _column(rng.integers(1, 500, rows))
+
+    return pd.DataFrame({
+        '核准登記營業日期': pd.to_datetime("1990-01-01")
+                      + pd.to_timedelta(rng.integers(0, 12_000, rows), unit="D"),
+        '縣市旅宿登記證號': "旅宿字第" + ids + "號",
+        '類別': categories,
+        '標章': pd.Series(marks).replace("", np.nan),
+        '溫泉標章': np.where(rng.random(rows) < 0.1, "是", "否"),
+        '旅宿名稱': _column(rng.choice(NAME_PREFIXES, rows)) + _column(rng.choice(NAME_SUFFIXES, rows)) + ids,
+        '縣市': anchor['縣市'],
+        '鄉鎮': anchor['鄉鎮'],
+        '郵遞區號': anchor['郵遞區號'],
+        '地址': anchor['縣市'] + anchor['鄉鎮'] + _column(rng.choice(ROADS, rows)) + numbers + "號",
+        '電話或手機': "0" + _column(rng.integers(2, 9, rows)) + "-" + _column(rng.integers(20_000_000, 89_999_999, rows)),
+        '傳真': "",
+        '房間數': np.clip(np.round(rooms), 4, 1200).astype(int),
+        '電子郵件': "service" + ids + "@example.com",
+        '網址': "https://hotel" + ids + ".example.com",
+        'lat': np.clip(lat, *TAIWAN_BOUNDS["lat"]).round(7),
+        'lng': np.clip(lng, *TAIWAN_BOUNDS["lng"]).round(7),
+    })
+
+
+def stub_geocoder():
+    """離線地名表 + 記憶體快取 + 固定座標替身（查無地名時回傳台北車站）"""
+    return Geocoder(load_gazetteer(), GeocodeCache(":memory:"), lambda address: QUERY_POINTS[0])
+
+
+def timed(func, repeat, warmup=0):
+    """先執行 warmup 次不計時，再執行 repeat 次，回傳 (各次耗時秒數, 最後一次的回傳值)"""
+    for _ in range(warmup):
+        func()
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return times, result
+
+
+def _summary(rows, stage, times, items=None):
+    record = {
+        "rows": rows,
+        "stage": stage,
+        "repeat": len(times),
+        "min_ms": round(min(times) * 1000, 3),
+        "median_ms": round(statistics.median(times) * 1000, 3),
+        "mean_ms": round(statistics.fmean(times) * 1000, 3),
+    }
+    if items is not None:
+        record["items"] = int(items)
+    return record
+
+
+def run_size(rows, repeat, workdir, seed=0, log=print):
+    """對 rows 筆合成資料執行所有階段，回傳結果列表"""
+    csv_path = os.path.join(workdir, f"registry_{rows}.csv")
+    artifact_path = os.path.splitext(csv_path)[0] + ".feather"
+    generate_registry(rows, seed=seed).to_csv(csv_path, index=False, encoding="utf-8")
+    results = []
+
+    def record(stage, func, repeat=repeat, count=len, warmup=1):
+        times, result = timed(func, repeat, warmup)
+        items = count(result) if count is not None else None
+        results.append(_summary(rows, stage, times, items))
+        log(f"  {rows:>9,} {stage:<16} {results[-1]['median_ms']:>12.3f} ms")
+        return result
+
+    # 讀取 CSV 與建置資料檔的成本較高，大資料量時只執行一次
+    heavy_repeat = 1 if rows >= 100_000 else repeat
+    df = record("load_csv", lambda: read_hotel_csv(csv_path), heavy_repeat, warmup=0)
+    record("build_artifact", lambda: build_dataset_artifact(csv_path, artifact_path, df=df),
+           heavy_repeat, count=None, warmup=0)
+    df = record("load_artifact", lambda: load_hotel_dataframe(csv_path, artifact_path),
+                heavy_repeat, warmup=0)
+    dataset = record("build_dataset", lambda: HotelDataset(df), heavy_repeat, warmup=0)
+    filters = dataset.filters
+
+    record("filter_star", lambda: filters.compose(), count=np.count_nonzero)
+    record("filter_combined",
+           lambda: filters.compose(star="五星級", hot_spring=True, room_size="large"),
+           count=np.count_nonzero)
+    mask = filters.compose()
+
+    record("radius_10km",
+           lambda: [search_location(dataset, loc, mask, 10) for loc in QUERY_POINTS],
+           count=lambda frames: sum(len(frame) for frame in frames))
+    record("knn_10",
+           lambda: [search_nearest(dataset, loc, mask, 10) for loc in QUERY_POINTS],
+           count=lambda frames: sum(len(frame) for frame in frames))
+
+    record("build_text_index", lambda: TextIndex(dataset.frame), heavy_repeat, count=None, warmup=0)
+    record("text_search",
+           lambda: [dataset.text.search(query) for query in TEXT_QUERIES],
+           count=lambda results: sum(len(positions) for positions, _ in results))
+    record("text_search_star",
+           lambda: [dataset.text.search(query, mask) for query in TEXT_QUERIES],
+           count=lambda results: sum(len(positions) for positions, _ in results))
+
+    geocoder = stub_geocoder()
+
+    def compare():
+        location_coords = {place: geocoder.geocode(place) for place in COMPARE_PLACES}
+        hits = search_locations(dataset, location_coords, mask, 10)
+        return hits, comparison_stats(location_coords, hits)
+
+    hits, _ = record("compare_5", compare, count=lambda result: len(result[0]))
+
+    def export(fmt):
+        with export_file(hits, fmt) as f:
+            return f.read()
+
+    record("export_csv", lambda: export("CSV"), count=None)
+    record("export_geojson", lambda: export("GeoJSON"), count=None)
+    return results
+
+
+def environment_info():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+    }
+
+
+def find_regressions(results, baseline, threshold):
+    """與 baseline 相同資料量與階段的 median 相比，變慢超過 threshold 倍者視為退步"""
+    previous = {(r["rows"], r["stage"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        old = previous.get((result["rows"], result["stage"]))
+        if old is None or max(old["median_ms"], result["median_ms"]) < REGRESSION_FLOOR_MS:
+            continue
+        if old["median_ms"] > 0 and result["median_ms"] > old["median_ms"] * threshold:
+            regressions.append({
+                "rows": result["rows"],
+                "stage": result["stage"],
+                "baseline_ms": old["median_ms"],
+                "median_ms": result["median_ms"],
+                "ratio": round(result["median_ms"] / old["median_ms"], 2),
+            })
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="台灣飯店查詢效能基準測試")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="合成資料筆數")
+    parser.add_argument("--repeat", type=int, default=5, help="每個階段重複次數")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="結果 JSON 檔")
+    parser.add_argument("--workdir", help="合成資料存放目錄（預設使用暫存目錄）")
+    parser.add_argument("--baseline", help="先前的結果 JSON，用於比較效能退步")
+    parser.add_argument("--threshold", type=float, default=1.25, help="median 變慢超過此倍數視為退步")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="hotel_bench_") as tmp:
+        workdir = args.workdir or tmp
+        os.makedirs(workdir, exist_ok=True)
+        for rows in args.sizes:
+            print(f"資料量 {rows:,} 筆")
+            results.extend(run_size(rows, args.repeat, workdir, seed=args.seed))
+
+    report = {"environment": environment_info(), "results": results}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["regressions"] = find_regressions(results, json.load(f), args.threshold)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果已寫入 {args.output}")
+
+    for regression in report.get("regressions", []):
+        print(f"效能退步：{regression['rows']:,} 筆 {regression['stage']} "
+              f"{regression['baseline_ms']} → {regression['median_ms']} ms（{regression['ratio']} 倍）")
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
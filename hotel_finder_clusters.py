@@ -0,0 +1,197 @@
+"""地圖群集：預先計算各縮放層級的網格聚合
+
+地圖使用 Web Mercator 投影：縮放層級 z 的整個世界為 256 × 2^z 像素，
+每一層以 CLUSTER_CELL_PX × CLUSTER_CELL_PX 像素為一個網格，網格內的飯店合併成一個群集
+（位置為成員座標的平均，大小為成員數）。MIN_ZOOM ~ MAX_ZOOM 每一層的聚合結果
+（網格鍵排序後的 CSR：成員位置、每格起點、筆數、中心座標）在第一次使用某組篩選條件時一次建立，
+之後的查詢只需以二分搜尋取出可視範圍（bbox）內的網格，不再掃描整份資料。
+
+- 只有一間飯店的網格以單點回傳（附飯店位置），超過 MAX_ZOOM 時所有網格都展開成單點
+- 可視範圍內的網格數超過 MAX_MAP_FEATURES 時自動改用較粗的層級，
+  因此不論資料筆數多少，回傳的群集與單點數量都有上限
+- 不同篩選條件的聚合以 LRU 保留最近 MAX_CACHED_FILTERS 組
+
+    pyramid = ClusterPyramid(dataset.lats, dataset.lngs)
+    features, zoom = pyramid.query(12, viewport_bbox((25.04, 121.56), 12), mask, filter_key)
+
+fit_view 依一組座標（例如搜尋結果）計算能完整顯示的地圖中心與縮放層級。
+"""
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+TILE_PX = 256
+CLUSTER_CELL_PX = 64
+MIN_ZOOM = 5
+MAX_ZOOM = 16
+MAX_MAP_FEATURES = 2000
+MAX_CACHED_FILTERS = 16
+
+# Web Mercator 可表示的緯度上限
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def mercator_xy(lats, lngs):
+    """經緯度 → 0 ~ 1 的 Web Mercator 世界座標 (x, y)，y 由北向南遞增"""
+    lats = np.clip(np.asarray(lats, dtype=np.float64), -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    x = (lngs + 180.0) / 360.0
+    y = 0.5 - np.log(np.tan(np.pi / 4.0 + np.radians(lats) / 2.0)) / (2.0 * np.pi)
+    return x, y
+
+
+def _mercator_lat(y):
+    return math.degrees(math.atan(math.sinh(math.pi * (1.0 - 2.0 * y))))
+
+
+def viewport_bbox(center, zoom, width_px=1200, height_px=500):
+    """以中心座標與縮放層級計算地圖可視範圍，回傳 (南, 西, 北, 東)"""
+    x, y = (float(v) for v in mercator_xy(center[0], center[1]))
+    world = TILE_PX * 2.0 ** zoom
+    half_w, half_h = width_px / 2.0 / world, height_px / 2.0 / world
+    south = _mercator_lat(min(y + half_h, 1.0))
+    north = _mercator_lat(max(y - half_h, 0.0))
+    west = max((x - half_w) * 360.0 - 180.0, -180.0)
+    east = min((x + half_w) * 360.0 - 180.0, 180.0)
+    return south, west, north, east
+
+
+def fit_view(lats, lngs, width_px=1200, height_px=500, padding_px=40, max_zoom=MAX_ZOOM):
+    """能完整顯示所有座標的地圖中心與縮放層級，回傳 ((緯度, 經度), 縮放層級)"""
+    x, y = mercator_xy(lats, lngs)
+    valid = np.isfinite(x) & np.isfinite(y)
+    x, y = x[valid], y[valid]
+    center_x, center_y = (x.min() + x.max()) / 2.0, (y.min() + y.max()) / 2.0
+    span_x, span_y = x.max() - x.min(), y.max() - y.min()
+    # 世界寬度 256 × 2^z 像素：找出範圍（加上邊距）仍放得進地圖的最大層級
+    fits = [
+        math.log2(max(pixels - 2 * padding_px, 1) / (TILE_PX * span))
+        for span, pixels in ((span_x, width_px), (span_y, height_px)) if span > 0
+    ]
+    zoom = int(np.clip(math.floor(min(fits)), 0, max_zoom)) if fits else max_zoom
+    return (_mercator_lat(float(center_y)), float(center_x) * 360.0 - 180.0), zoom
+
+
+class ClusterLevel:
+    """單一縮放層級的網格聚合（依網格鍵排序）"""
+
+    def __init__(self, zoom, positions, x, y, lats, lngs, cell_px=CLUSTER_CELL_PX):
+        self.zoom = zoom
+        self.cells_per_side = TILE_PX * 2 ** zoom // cell_px
+        n = self.cells_per_side
+        cols = np.minimum((x * n).astype(np.int64), n - 1)
+        rows = np.minimum((y * n).astype(np.int64), n - 1)
+        keys = rows * n + cols
+        order = np.argsort(keys, kind='stable')
+        self.members = positions[order]
+        self.keys, self.starts, self.counts = np.unique(keys[order], return_index=True, return_counts=True)
+        self.lats = np.add.reduceat(lats[order], self.starts) / self.counts if len(order) else np.empty(0)
+        self.lngs = np.add.reduceat(lngs[order], self.starts) / self.counts if len(order) else np.empty(0)
+
+    def cells_in(self, bbox):
+        """可視範圍內的網格索引（bbox 為 (南, 西, 北, 東)）"""
+        south, west, north, east = bbox
+        x0, y0 = mercator_xy(north, west)
+        x1, y1 = mercator_xy(south, east)
+        n = self.cells_per_side
+        col0, col1 = int(np.clip(x0 * n, 0, n - 1)), int(np.clip(x1 * n, 0, n - 1))
+        row0, row1 = int(np.clip(y0 * n, 0, n - 1)), int(np.clip(y1 * n, 0, n - 1))
+        # 網格鍵為 row × n + col：先以二分搜尋取出列範圍，再篩選欄
+        lo = np.searchsorted(self.keys, row0 * n)
+        hi = np.searchsorted(self.keys, (row1 + 1) * n)
+        cols = self.keys[lo:hi] % n
+        return lo + np.flatnonzero((cols >= col0) & (cols <= col1))
+
+
+class ClusterPyramid:
+    """各縮放層級的群集聚合，依篩選條件延遲建立並快取（執行緒安全）"""
+
+    def __init__(self, lats, lngs, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, cell_px=CLUSTER_CELL_PX,
+                 max_features=MAX_MAP_FEATURES, max_filters=MAX_CACHED_FILTERS):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lngs = np.asarray(lngs, dtype=np.float64)
+        self.x, self.y = mercator_xy(self.lats, self.lngs)
+        self.valid = np.isfinite(self.x) & np.isfinite(self.y)
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.cell_px = cell_px
+        self.max_features = max_features
+        self.max_filters = max_filters
+        self._levels = OrderedDict()  # 篩選鍵 → [ClusterLevel, ...]
+        self._lock = threading.Lock()
+
+    def levels(self, mask=None, filter_key=None):
+        """某組篩選條件各層級的聚合；filter_key 為可雜湊的篩選條件（None 表示不篩選）"""
+        with self._lock:
+            levels = self._levels.get(filter_key)
+            if levels is not None:
+                self._levels.move_to_end(filter_key)
+                return levels
+        # 建立時不持有鎖，同一組條件同時建立時結果相同
+        keep = self.valid if mask is None else self.valid & mask
+        positions = np.flatnonzero(keep)
+        x, y, lats, lngs = self.x[positions], self.y[positions], self.lats[positions], self.lngs[positions]
+        levels = [ClusterLevel(zoom, positions, x, y, lats, lngs, self.cell_px)
+                  for zoom in range(self.min_zoom, self.max_zoom + 1)]
+        with self._lock:
+            self._levels[filter_key] = levels
+            while len(self._levels) > self.max_filters:
+                self._levels.popitem(last=False)
+        return levels
+
+    def query(self, zoom, bbox, mask=None, filter_key=None):
+        """可視範圍內的群集與單點
+
+        回傳 (DataFrame, 實際使用的層級)：欄位為 lat、lng、count、position
+        （單點的飯店位置；群集為 -1）。超過 MAX_ZOOM 時回傳範圍內的所有飯店單點。
+        """
+        levels = self.levels(mask, filter_key)
+        level_zoom = int(np.clip(math.floor(zoom), self.min_zoom, self.max_zoom))
+        if zoom > self.max_zoom:
+            level = levels[-1]
+            cells = level.cells_in(bbox)
+            if level.counts[cells].sum() <= self.max_features:
+                return self._points(level, cells), math.floor(zoom)
+        # 範圍內網格太多時改用較粗的層級，回傳筆數不超過上限
+        while True:
+            level = levels[level_zoom - self.min_zoom]
+            cells = level.cells_in(bbox)
+            if len(cells) <= self.max_features or level_zoom == self.min_zoom:
+                break
+            level_zoom -= 1
+        cells = cells[:self.max_features]
+        counts = level.counts[cells]
+        single = counts == 1
+        positions = np.full(len(cells), -1, dtype=np.int64)
+        positions[single] = level.members[level.starts[cells[single]]]
+        return pd.DataFrame({
+            "lat": level.lats[cells],
+            "lng": level.lngs[cells],
+            "count": counts,
+            "position": positions,
+        }), level_zoom
+
+    def _points(self, level, cells):
+        """展開網格成員為單點"""
+        starts, counts = level.starts[cells], level.counts[cells]
+        index = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        positions = level.members[index]
+        return pd.DataFrame({
+            "lat": self.lats[positions],
+            "lng": self.lngs[positions],
+            "count": np.ones(len(positions), dtype=np.int64),
+            "position": positions,
+        })
+
+
+def label_features(features, frame):
+    """在群集結果加上顯示文字：單點為飯店名稱與標章，群集為飯店數"""
+    single = features['position'].to_numpy() >= 0
+    labels = (features['count'].astype(str) + " 間飯店").to_numpy(dtype=object)
+    if single.any():
+        hits = frame.iloc[features['position'].to_numpy()[single]]
+        labels[single] = (hits['旅宿名稱'].astype(str) + "（" + hits['標章'].astype(str) + "）").to_numpy()
+    return features.assign(label=labels)
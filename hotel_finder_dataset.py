@@ -0,0 +1,285 @@
+"""飯店資料集載入：欄式二進位資料檔（Arrow Feather）
+
+建置步驟會把 hotel_with_latlng.csv 轉成未壓縮的 Feather 檔：
+- lat / lng 預先轉為 float64 陣列
+- 房間數預先解析為整數（無法解析者為缺值）
+- 標章、溫泉標章、縣市、鄉鎮以字典編碼（category）儲存
+
+載入時以記憶體映射（memory map）讀取，不需再解析 CSV；
+資料檔記錄了來源 CSV 的大小與修改時間，CSV 更新後資料檔即視為過期，
+此時改讀 CSV 並嘗試重建資料檔。未安裝 pyarrow 時一律讀取 CSV。
+
+HotelDataset 建立時先以向量化運算一次檢查所有資料列（validate_hotel_frame）：
+座標缺漏或無法解析、超出台灣（含離島）範圍、登記證號重複的資料列移到 quarantine，
+之後的篩選與距離計算都可以假設座標是有效的數值陣列。
+
+HotelDataset 將精簡後的資料表與篩選遮罩、空間索引包在一起，整個行程只建立一份，
+所有 Streamlit session 共用（st.cache_resource），呼叫端只能讀取、不可修改。
+精簡欄位：只保留搜尋會用到的欄位（去除傳真、電子郵件、網址、核准登記營業日期），
+分類欄位為 category，座標為 float32（精度約 1 公尺）。
+
+    python hotel_finder_dataset.py [hotel_with_latlng.csv]
+"""
+import functools
+import os
+import sys
+import tempfile
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from hotel_finder_clusters import ClusterPyramid
+from hotel_finder_filters import CountCube, FilterIndex
+from hotel_finder_ranking import RankingFeatures
+from hotel_finder_spatial import GridIndex
+from hotel_finder_text import TextIndex
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - pyarrow 為選用套件
+    pa = None
+    feather = None
+
+# 資料檔格式版本，欄位處理方式改變時遞增以強制重建
+ARTIFACT_VERSION = "1"
+
+CATEGORY_COLUMNS = ['標章', '溫泉標章', '縣市', '鄉鎮']
+REGISTRY_KEY = '縣市旅宿登記證號'
+
+# 台灣本島與澎湖、金門、馬祖、綠島、蘭嶼的經緯度範圍
+TAIWAN_LAT_RANGE = (21.8, 26.5)
+TAIWAN_LNG_RANGE = (118.0, 122.2)
+
+QUARANTINE_REASONS = {
+    "missing_coords": "座標缺漏或無法解析",
+    "outside_taiwan": "座標超出台灣範圍",
+    "duplicate_license": "登記證號重複",
+}
+
+# 搜尋、篩選與結果顯示會用到的欄位
+HOT_COLUMNS = [
+    '縣市旅宿登記證號', '類別', '標章', '溫泉標章', '旅宿名稱', '縣市', '鄉鎮',
+    '郵遞區號', '地址', '電話或手機', '房間數', 'lat', 'lng',
+]
+
+
+def artifact_path_for(csv_path):
+    """CSV 對應的欄式資料檔路徑"""
+    return os.path.splitext(csv_path)[0] + ".feather"
+
+
+def _source_signature(csv_path):
+    stat = os.stat(csv_path)
+    return {"source_size": str(stat.st_size), "source_mtime_ns": str(stat.st_mtime_ns)}
+
+
+def dataset_version(csv_path, artifact_path=None):
+    """資料集版本字串：由資料格式版本與來源檔案（CSV 或資料檔）的大小、修改時間組成"""
+    artifact_path = artifact_path or artifact_path_for(csv_path)
+    source = csv_path if os.path.exists(csv_path) else artifact_path
+    signature = _source_signature(source)
+    return f"{ARTIFACT_VERSION}:{signature['source_size']}:{signature['source_mtime_ns']}"
+
+
+def prepare_hotel_frame(df):
+    """統一的欄位前處理：座標轉 float、房間數轉整數、分類欄位字典編碼"""
+    df = df.copy()
+    df['lat'] = pd.to_numeric(df['lat'], errors='coerce').astype(float)
+    df['lng'] = pd.to_numeric(df['lng'], errors='coerce').astype(float)
+    if '房間數' in df.columns:
+        df['房間數'] = pd.to_numeric(df['房間數'], errors='coerce').round().astype('Int64')
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+    return df
+
+
+def read_hotel_csv(csv_path):
+    """讀取並前處理原始 CSV"""
+    return prepare_hotel_frame(pd.read_csv(csv_path, encoding="utf-8"))
+
+
+def build_dataset_artifact(csv_path, artifact_path=None, df=None):
+    """將 CSV 轉為欄式資料檔，回傳資料檔路徑"""
+    if feather is None:
+        raise RuntimeError("建立欄式資料檔需要 pyarrow")
+    artifact_path = artifact_path or artifact_path_for(csv_path)
+    if df is None:
+        df = read_hotel_csv(csv_path)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata.update({
+        b"artifact_version": ARTIFACT_VERSION.encode(),
+        **{key.encode(): value.encode() for key, value in _source_signature(csv_path).items()},
+    })
+    table = table.replace_schema_metadata(metadata)
+    # 先寫入同目錄下唯一名稱的暫存檔再換名：其他行程不會讀到寫到一半的檔案，
+    # 多個行程同時建立時也不會寫入同一個暫存檔
+    directory = os.path.dirname(os.path.abspath(artifact_path))
+    with tempfile.NamedTemporaryFile(dir=directory, prefix=os.path.basename(artifact_path) + ".",
+                                     suffix=".tmp", delete=False) as tmp:
+        tmp_path = tmp.name
+    try:
+        feather.write_feather(table, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, artifact_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return artifact_path
+
+
+def artifact_is_fresh(csv_path, artifact_path=None):
+    """資料檔存在且與目前的 CSV 一致（CSV 不存在時只要資料檔存在即可）"""
+    if feather is None:
+        return False
+    artifact_path = artifact_path or artifact_path_for(csv_path)
+    if not os.path.exists(artifact_path):
+        return False
+    try:
+        with pa.memory_map(artifact_path) as source:
+            metadata = pa.ipc.open_file(source).schema.metadata or {}
+    except Exception:
+        return False
+    if metadata.get(b"artifact_version") != ARTIFACT_VERSION.encode():
+        return False
+    if not os.path.exists(csv_path):
+        return True
+    signature = _source_signature(csv_path)
+    return all(metadata.get(key.encode()) == value.encode() for key, value in signature.items())
+
+
+def load_hotel_dataframe(csv_path, artifact_path=None):
+    """載入飯店資料：優先記憶體映射欄式資料檔，過期或不存在時讀取 CSV 並重建"""
+    artifact_path = artifact_path or artifact_path_for(csv_path)
+    if artifact_is_fresh(csv_path, artifact_path):
+        table = feather.read_table(artifact_path, memory_map=True)
+        # split_blocks 讓數值欄位可直接引用映射的記憶體，不另外合併複製
+        return table.to_pandas(split_blocks=True)
+
+    df = read_hotel_csv(csv_path)
+    if feather is not None:
+        try:
+            build_dataset_artifact(csv_path, artifact_path, df=df)
+        except OSError:
+            pass  # 唯讀環境無法寫入資料檔時，仍可使用 CSV
+    return df
+
+
+def validate_hotel_frame(df):
+    """載入時一次檢查所有資料列，回傳 (可用資料, 隔離資料, 摘要 dict)
+
+    - lat / lng 轉為數值，缺漏或無法解析者隔離
+    - 座標超出台灣（含離島）範圍者隔離
+    - 縣市旅宿登記證號重複者保留第一筆，其餘隔離
+    隔離資料多一個「隔離原因」欄位；房間數無法解析時只視為缺值（不屬於任何規模），不隔離。
+    """
+    lats = pd.to_numeric(df['lat'], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    lngs = pd.to_numeric(df['lng'], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    missing = ~(np.isfinite(lats) & np.isfinite(lngs))
+    with np.errstate(invalid='ignore'):
+        inside = ((lats >= TAIWAN_LAT_RANGE[0]) & (lats <= TAIWAN_LAT_RANGE[1])
+                  & (lngs >= TAIWAN_LNG_RANGE[0]) & (lngs <= TAIWAN_LNG_RANGE[1]))
+    outside = ~missing & ~inside
+    # 重複只在座標有效的資料列之間判斷，第一筆座標有問題時改保留下一筆
+    duplicate = np.zeros(len(df), dtype=bool)
+    if REGISTRY_KEY in df.columns:
+        keys = df[REGISTRY_KEY].astype(object).where(~(missing | outside))
+        duplicate = (keys.duplicated(keep='first') & keys.notna()).to_numpy()
+
+    flags = {"missing_coords": missing, "outside_taiwan": outside, "duplicate_license": duplicate}
+    reasons = np.select(list(flags.values()), [QUARANTINE_REASONS[name] for name in flags], default="")
+    bad = reasons != ""
+    quarantine = df[bad].assign(隔離原因=reasons[bad])
+    report = {"total": len(df), "valid": int((~bad).sum())}
+    report.update({name: int(flag.sum()) for name, flag in flags.items()})
+    if '房間數' in df.columns:
+        report["rooms_missing"] = int(pd.to_numeric(df['房間數'], errors='coerce').isna().sum())
+    return df[~bad], quarantine, report
+
+
+def validation_summary(report):
+    """資料檢查摘要文字"""
+    parts = [f"{QUARANTINE_REASONS[name]} {report[name]} 筆"
+             for name in QUARANTINE_REASONS if report.get(name)]
+    excluded = report["total"] - report["valid"]
+    text = f"資料檢查：{report['valid']:,} / {report['total']:,} 筆可用"
+    if excluded:
+        text += f"，隔離 {excluded:,} 筆（{'、'.join(parts)}）"
+    return text
+
+
+def compact_hotel_frame(df):
+    """精簡資料表：只保留常用欄位、分類欄位轉 category、座標轉 float32"""
+    df = df[[column for column in HOT_COLUMNS if column in df.columns]].copy()
+    for column in CATEGORY_COLUMNS + ['類別']:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    df['lat'] = df['lat'].astype(np.float32)
+    df['lng'] = df['lng'].astype(np.float32)
+    return df.reset_index(drop=True)
+
+
+def _read_only(values):
+    values = np.array(values)
+    values.flags.writeable = False
+    return values
+
+
+class HotelDataset:
+    """共用的唯讀飯店資料集：精簡資料表 + 座標陣列 + 篩選遮罩 + 筆數立方體 + 評分特徵 + 名稱地址索引 + 空間索引 + 地圖群集
+
+    version 用來判斷快取的搜尋結果是否仍然有效；未指定時每個實例各自獨立。
+    未通過檢查的資料列放在 quarantine（DataFrame），檢查摘要在 validation。
+    名稱地址索引（text）與全部旅宿的地圖群集（clusters）只有 API 與輸入即搜尋會用到，第一次存取時才建立。
+    """
+
+    def __init__(self, df, version=None):
+        self.version = version or uuid.uuid4().hex
+        df, self.quarantine, self.validation = validate_hotel_frame(df)
+        self.frame = compact_hotel_frame(df)
+        self.lats = _read_only(self.frame['lat'].to_numpy())
+        self.lngs = _read_only(self.frame['lng'].to_numpy())
+        self.filters = FilterIndex(self.frame)
+        self.counts = CountCube(self.frame)
+        self.ranking = RankingFeatures(self.frame)
+        self.spatial = GridIndex(self.lats, self.lngs)
+
+    @functools.cached_property
+    def text(self):
+        """旅宿名稱、地址的 n-gram 索引（批次搜尋、tkinter 不需要，延遲到第一次使用時建立）"""
+        return TextIndex(self.frame)
+
+    @functools.cached_property
+    def clusters(self):
+        """全部旅宿的各層級地圖群集（API /clusters 使用），各篩選條件的聚合在第一次查詢時建立"""
+        return ClusterPyramid(self.lats, self.lngs)
+
+    @classmethod
+    def from_csv(cls, csv_path):
+        df = load_hotel_dataframe(csv_path)
+        return cls(df, version=dataset_version(csv_path))
+
+    def __len__(self):
+        return len(self.frame)
+
+    def memory_usage(self):
+        """資料表實際佔用的位元組數（含字串內容）"""
+        return int(self.frame.memory_usage(deep=True).sum())
+
+
+def quarantine_path_for(csv_path):
+    """隔離資料列的輸出檔路徑"""
+    return os.path.splitext(csv_path)[0] + "_quarantine.csv"
+
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else "hotel_with_latlng.csv"
+    path = build_dataset_artifact(source)
+    print(f"已產生欄式資料檔：{path}")
+    dataset = HotelDataset.from_csv(source)
+    print(validation_summary(dataset.validation))
+    if len(dataset.quarantine):
+        dataset.quarantine.to_csv(quarantine_path_for(source), index=False, encoding="utf-8-sig")
+        print(f"隔離的資料列已寫入 {quarantine_path_for(source)}")
@@ -0,0 +1,194 @@
+"""飯店距離計算引擎
+
+以 NumPy 一次計算所有飯店與查詢地點的距離，取代逐列 iterrows + geodesic 的迴圈。
+
+距離模式：
+- haversine（快速）：球面大圓距離，地球半徑取 WGS84 平均半徑 6371.0088 公里。
+  在台灣緯度（約 21.5°N ~ 26.5°N）與 geopy 的 geodesic（WGS84 橢球）相比，
+  相對誤差不超過約 0.4%（南北向略為高估、東西向略為低估）。
+- refine（預設）：先以 haversine 篩出候選，再只對落在半徑邊界
+  ±HAVERSINE_REL_TOLERANCE 範圍內的飯店以 geodesic 重新計算，
+  因此「是否在範圍內」的判斷與原本的 geodesic 結果完全一致；
+  邊界帶內的距離為精確值，其餘距離與 geodesic 的相對誤差 < HAVERSINE_REL_TOLERANCE。
+
+多地點搜尋（find_within_radius_many）以 N×M 距離矩陣一次計算 N 個查詢點，
+矩陣依 MATRIX_CHUNK_ELEMENTS 分塊計算以控制記憶體，回傳長表形式的稀疏結果。
+
+最近 N 間（find_nearest）以 argpartition 部分選取，只排序前 k 筆，成本為 O(M + k log k)；
+距離為 haversine，只有指定最遠距離上限時才在上限邊界帶內以 geodesic 校正。
+"""
+import numpy as np
+import pandas as pd
+from geopy.distance import geodesic
+
+EARTH_RADIUS_KM = 6371.0088
+
+# haversine 與 geodesic 在台灣範圍內的相對誤差上限（保守取 0.5%）
+HAVERSINE_REL_TOLERANCE = 0.005
+
+# 距離矩陣每一塊最多的元素數（約 32 MB 的 float64）
+MATRIX_CHUNK_ELEMENTS = 4_000_000
+
+
+def coordinate_arrays(df):
+    """取得 lat / lng 的 float 陣列，無法轉換的座標為 NaN（不會落入任何範圍）"""
+    lats = pd.to_numeric(df['lat'], errors='coerce').to_numpy(dtype=float)
+    lngs = pd.to_numeric(df['lng'], errors='coerce').to_numpy(dtype=float)
+    return lats, lngs
+
+
+def _haversine(lat0, lng0, lat1, lng1):
+    """haversine 距離（公里），輸入為弧度，支援 NumPy broadcasting"""
+    a = (np.sin((lat1 - lat0) / 2.0) ** 2
+         + np.cos(lat0) * np.cos(lat1) * np.sin((lng1 - lng0) / 2.0) ** 2)
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _radians(values):
+    # 座標可能以 float32 儲存，計算距離前一律轉為 float64 以免損失精度
+    return np.radians(np.asarray(values, dtype=np.float64))
+
+
+def haversine_km(origin, lats, lngs):
+    """計算 origin (lat, lng) 到所有座標的 haversine 距離（公里）"""
+    return _haversine(np.radians(origin[0]), np.radians(origin[1]),
+                      _radians(lats), _radians(lngs))
+
+
+def distance_matrix(origins, lats, lngs):
+    """計算 N 個查詢點到 M 間飯店的 haversine 距離矩陣（N×M，公里）"""
+    origins = _radians(origins).reshape(-1, 2)
+    return _haversine(origins[:, :1], origins[:, 1:],
+                      _radians(lats)[None, :], _radians(lngs)[None, :])
+
+
+def refine_geodesic(origin, lats, lngs, distances, radius_km):
+    """只對半徑邊界附近的候選以 geodesic 重新計算距離（就地更新 distances）"""
+    band = radius_km * HAVERSINE_REL_TOLERANCE
+    near_edge = np.flatnonzero(np.abs(distances - radius_km) <= band)
+    for i in near_edge:
+        distances[i] = geodesic(origin, (float(lats[i]), float(lngs[i]))).km
+    return distances
+
+
+def find_within_radius(origin, lats, lngs, radius_km, refine=True):
+    """找出半徑內的飯店
+
+    回傳 (positions, distances)：positions 為陣列位置（依距離由近到遠排序），
+    distances 為對應距離（公里）。
+    """
+    distances = haversine_km(origin, lats, lngs)
+    # 先以放寬後的半徑篩出候選，NaN 座標在比較時自然被排除
+    limit = radius_km * (1.0 + HAVERSINE_REL_TOLERANCE) if refine else radius_km
+    positions = np.flatnonzero(distances <= limit)
+    candidate = distances[positions]
+    if refine and len(positions):
+        candidate = refine_geodesic(origin, lats[positions], lngs[positions],
+                                    candidate, radius_km)
+        keep = candidate <= radius_km
+        positions = positions[keep]
+        candidate = candidate[keep]
+    # 依四捨五入後的距離做穩定排序，與原本 sorted(..., key=距離) 的結果一致
+    order = np.argsort(np.round(candidate, 2), kind='stable')
+    return positions[order], candidate[order]
+
+
+def find_within_radius_many(origins, lats, lngs, radius_km, refine=True):
+    """多地點半徑搜尋（分塊距離矩陣）
+
+    回傳長表形式的 (query_ids, positions, distances)：query_ids 為查詢點序號，
+    positions 為飯店陣列位置；先依查詢點、再依距離由近到遠排序。
+    """
+    origins = np.asarray(origins, dtype=float).reshape(-1, 2)
+    limit = radius_km * (1.0 + HAVERSINE_REL_TOLERANCE) if refine else radius_km
+    rows_per_chunk = max(1, MATRIX_CHUNK_ELEMENTS // max(len(lats), 1))
+
+    query_parts, position_parts, distance_parts = [], [], []
+    for start in range(0, len(origins), rows_per_chunk):
+        block = distance_matrix(origins[start:start + rows_per_chunk], lats, lngs)
+        query_ids, positions = np.nonzero(block <= limit)
+        query_parts.append(query_ids + start)
+        position_parts.append(positions)
+        distance_parts.append(block[query_ids, positions])
+
+    query_ids = np.concatenate(query_parts) if query_parts else np.empty(0, dtype=np.int64)
+    positions = np.concatenate(position_parts) if position_parts else np.empty(0, dtype=np.int64)
+    distances = np.concatenate(distance_parts) if distance_parts else np.empty(0)
+
+    if refine and len(distances):
+        band = radius_km * HAVERSINE_REL_TOLERANCE
+        for i in np.flatnonzero(np.abs(distances - radius_km) <= band):
+            origin = tuple(origins[query_ids[i]])
+            hotel = (float(lats[positions[i]]), float(lngs[positions[i]]))
+            distances[i] = geodesic(origin, hotel).km
+        keep = distances <= radius_km
+        query_ids, positions, distances = query_ids[keep], positions[keep], distances[keep]
+
+    # 與單點搜尋相同：同一查詢點內依四捨五入後距離排序，距離相同時維持原始順序
+    order = np.lexsort((positions, np.round(distances, 2), query_ids))
+    return query_ids[order], positions[order], distances[order]
+
+
+def find_nearest(origin, lats, lngs, k, max_km=None, refine=True):
+    """找出最近的 k 間飯店（可選擇最遠距離上限 max_km）
+
+    回傳 (positions, distances)，依距離由近到遠排序；符合條件的飯店不足 k 間時全部回傳。
+    """
+    distances = haversine_km(origin, lats, lngs)
+    if max_km is None:
+        positions = np.flatnonzero(np.isfinite(distances))
+    else:
+        limit = max_km * (1.0 + HAVERSINE_REL_TOLERANCE) if refine else max_km
+        positions = np.flatnonzero(distances <= limit)
+    candidate = distances[positions]
+    if max_km is not None and refine and len(positions):
+        candidate = refine_geodesic(origin, lats[positions], lngs[positions], candidate, max_km)
+        keep = candidate <= max_km
+        positions = positions[keep]
+        candidate = candidate[keep]
+
+    k = max(int(k), 0)
+    if k < len(positions):
+        # 只需前 k 小的距離，不必排序全部候選
+        nearest = np.argpartition(candidate, k - 1)[:k] if k else np.empty(0, dtype=np.int64)
+        positions = positions[nearest]
+        candidate = candidate[nearest]
+    # 與半徑搜尋相同：依四捨五入後距離排序，距離相同時依原始列順序
+    order = np.lexsort((positions, np.round(candidate, 2)))
+    return positions[order], candidate[order]
+
+
+def build_hotel_frame(df, positions, distances, include_coords=True):
+    """將搜尋結果轉成畫面與下載使用的飯店資料表（DataFrame）"""
+    hits = df.iloc[positions]
+    size = len(hits)
+
+    def column(name, default='N/A'):
+        if name in hits.columns:
+            return hits[name].array
+        return np.full(size, default, dtype=object)
+
+    if '溫泉標章' in hits.columns:
+        hot_spring = hits['溫泉標章'].astype(object).eq('是').to_numpy(dtype=bool)
+    else:
+        hot_spring = np.zeros(size, dtype=bool)
+
+    records = {
+        "飯店名稱": hits['旅宿名稱'].to_numpy(),
+        "星級標章": hits['標章'].to_numpy(),
+        "地址": hits['地址'].to_numpy(),
+        "電話": column('電話或手機'),
+        "房間數": column('房間數'),
+        "溫泉": np.where(hot_spring, "♨️", ""),
+        "距離(公里)": np.round(distances, 2),
+    }
+    if include_coords:
+        # 座標載入時已檢查為有效數值並以 float32 儲存（精度約 1 公尺），輸出時取到小數第 6 位
+        records["經度"] = np.round(hits['lng'].to_numpy(dtype=float), 6)
+        records["緯度"] = np.round(hits['lat'].to_numpy(dtype=float), 6)
+    return pd.DataFrame(records)
+
+
+def build_hotel_records(df, positions, distances, include_coords=True):
+    """將搜尋結果轉成畫面與下載使用的飯店資料列表"""
+    return build_hotel_frame(df, positions, distances, include_coords).to_dict('records')
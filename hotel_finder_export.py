@@ -0,0 +1,101 @@
+"""搜尋結果匯出：CSV（UTF-8 BOM）、Parquet、GeoJSON
+
+每種格式都以 EXPORT_CHUNK_ROWS 列為一塊，逐塊寫入二進位檔案物件，
+不會先把整份結果轉成一個大字串再編碼。export_file() 寫入暫存檔後
+回傳可讀取的檔案物件，大量結果匯出時記憶體中只有下載按鈕需要的那一份內容。
+
+GeoJSON 以「經度」、「緯度」欄作為點座標，其餘欄位放在 properties；
+沒有座標的列 geometry 為 null。Parquet 需要 pyarrow（選用套件）。
+"""
+import codecs
+import json
+import os
+import tempfile
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow 為選用套件
+    pa = None
+    pq = None
+
+EXPORT_CHUNK_ROWS = 10_000
+COORD_COLUMNS = ['經度', '緯度']
+
+# 格式 → (副檔名, MIME 類型)
+EXPORT_FORMATS = {
+    "CSV": (".csv", "text/csv; charset=utf-8"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+    "GeoJSON": (".geojson", "application/geo+json"),
+}
+
+
+def available_formats():
+    """目前環境可用的匯出格式（未安裝 pyarrow 時不提供 Parquet）"""
+    return [name for name in EXPORT_FORMATS if name != "Parquet" or pq is not None]
+
+
+def _chunks(frame, chunk_rows):
+    for start in range(0, len(frame), chunk_rows):
+        yield frame.iloc[start:start + chunk_rows]
+
+
+def write_csv(frame, out, chunk_rows=EXPORT_CHUNK_ROWS):
+    """UTF-8 BOM + 標題列，再逐塊附加資料列（Excel 可直接開啟中文）"""
+    out.write(codecs.BOM_UTF8)
+    out.write(frame.iloc[:0].to_csv(index=False).encode("utf-8"))
+    for chunk in _chunks(frame, chunk_rows):
+        out.write(chunk.to_csv(index=False, header=False).encode("utf-8"))
+
+
+def write_parquet(frame, out, chunk_rows=EXPORT_CHUNK_ROWS):
+    """每塊寫成一個 row group"""
+    if pq is None:
+        raise RuntimeError("匯出 Parquet 需要安裝 pyarrow")
+    schema = pa.Schema.from_pandas(frame, preserve_index=False)
+    with pq.ParquetWriter(out, schema) as writer:
+        for chunk in _chunks(frame, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def write_geojson(frame, out, chunk_rows=EXPORT_CHUNK_ROWS):
+    """FeatureCollection，features 逐塊寫入"""
+    if not set(COORD_COLUMNS) <= set(frame.columns):
+        raise ValueError("匯出 GeoJSON 需要「經度」、「緯度」欄位")
+    out.write(b'{"type":"FeatureCollection","features":[')
+    first = True
+    for chunk in _chunks(frame, chunk_rows):
+        lngs = chunk['經度'].to_numpy(dtype=float, na_value=np.nan)
+        lats = chunk['緯度'].to_numpy(dtype=float, na_value=np.nan)
+        # to_json 會把缺值轉成 null、numpy 型別轉成 JSON 數字
+        properties = json.loads(chunk.drop(columns=COORD_COLUMNS).to_json(orient="records", force_ascii=False))
+        features = [
+            {
+                "type": "Feature",
+                "geometry": ({"type": "Point", "coordinates": [float(lng), float(lat)]}
+                             if np.isfinite(lng) and np.isfinite(lat) else None),
+                "properties": props,
+            }
+            for lng, lat, props in zip(lngs, lats, properties)
+        ]
+        text = json.dumps(features, ensure_ascii=False)[1:-1]
+        if text:
+            out.write((text if first else "," + text).encode("utf-8"))
+            first = False
+    out.write(b"]}")
+
+
+EXPORT_WRITERS = {"CSV": write_csv, "Parquet": write_parquet, "GeoJSON": write_geojson}
+
+
+def export_file(frame, fmt="CSV", chunk_rows=EXPORT_CHUNK_ROWS):
+    """將結果寫入暫存檔，回傳從頭開始讀取的二進位檔案物件（呼叫端負責關閉）"""
+    with tempfile.TemporaryFile() as f:
+        EXPORT_WRITERS[fmt](frame, f, chunk_rows)
+        f.flush()
+        # 複製檔案描述子：暫存檔關閉後，回傳的檔案物件仍可讀取，關閉時才刪除
+        reader = open(os.dup(f.fileno()), "rb")
+    reader.seek(0)
+    return reader
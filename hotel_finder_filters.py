@@ -0,0 +1,130 @@
+"""飯店篩選遮罩索引
+
+載入資料時一次建立各篩選條件的布林遮罩：
+- 星級飯店（標章含「星級」）
+- 每一種「標章」值
+- 每一種「溫泉標章」值
+- 每一種飯店規模（依房間數分級）
+
+compose() 只做遮罩的 AND 運算，不複製 DataFrame，也不再重複解析房間數或比對字串。
+
+CountCube 是 (標章, 溫泉標章, 飯店規模, 縣市) 的筆數立方體，載入時以一次 bincount 建立，
+側邊欄的「符合條件飯店」等統計只需對這個小陣列取切片加總，不必掃描整份資料；
+也可依縣市分組（by_county）供各縣市統計使用。
+"""
+import numpy as np
+import pandas as pd
+
+# 飯店規模分級代碼 → 側邊欄顯示文字
+ROOM_SIZE_LABELS = {
+    "small": "🏠 精品小型 (50間以下)",
+    "medium": "🏢 中型規模 (50-150間)",
+    "large": "🏨 大型飯店 (150-300間)",
+    "xlarge": "🏰 超大型 (300間以上)",
+}
+ROOM_SIZE_BY_LABEL = {label: bucket for bucket, label in ROOM_SIZE_LABELS.items()}
+
+
+def room_size_buckets(rooms):
+    """依房間數分級：<50、50-150、150(不含)-300、>300；無法解析的房間數不屬於任何等級"""
+    rooms = pd.to_numeric(pd.Series(rooms), errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    return np.select(
+        [rooms < 50, rooms <= 150, rooms <= 300, rooms > 300],
+        ["small", "medium", "large", "xlarge"],
+        default="",
+    )
+
+
+def value_masks(values):
+    """為欄位中每一種值建立布林遮罩"""
+    codes, uniques = pd.factorize(pd.Series(values), sort=True)
+    return {value: codes == i for i, value in enumerate(uniques)}
+
+
+class FilterIndex:
+    """預先計算的篩選遮罩，建立一次後唯讀共用"""
+
+    def __init__(self, df):
+        self.size = len(df)
+        marks = df['標章'].astype(str)
+        self.star_hotel = marks.str.contains("星級", na=False).to_numpy()
+        self.marks = value_masks(df['標章'])
+        self.hot_spring = value_masks(df['溫泉標章'])
+        self.room_sizes = value_masks(room_size_buckets(df['房間數']))
+        self._all = np.ones(self.size, dtype=bool)
+        self._none = np.zeros(self.size, dtype=bool)
+
+    def mark_mask(self, mark):
+        return self.marks.get(mark, self._none)
+
+    def hot_spring_mask(self):
+        return self.hot_spring.get('是', self._none)
+
+    def room_size_mask(self, bucket):
+        return self.room_sizes.get(bucket, self._none)
+
+    def compose(self, star=None, hot_spring=False, room_size=None, star_only=True):
+        """組合篩選條件，回傳布林遮罩（長度等於資料筆數）
+
+        star：指定標章（例如「五星級」），None 表示全部
+        hot_spring：True 時只保留有溫泉標章的飯店
+        room_size：飯店規模代碼（small / medium / large / xlarge），None 表示全部
+        star_only：是否只保留星級飯店（與原本的 filter_star_hotels 相同）
+        """
+        mask = self.star_hotel if star_only else self._all
+        if star is not None:
+            mask = mask & self.mark_mask(star)
+        if hot_spring:
+            mask = mask & self.hot_spring_mask()
+        if room_size is not None:
+            mask = mask & self.room_size_mask(room_size)
+        return mask
+
+
+class CountCube:
+    """(標章, 溫泉標章, 飯店規模, 縣市) 四維筆數表，建立一次後唯讀共用"""
+
+    def __init__(self, df):
+        axes = [
+            pd.Series(df['標章']).astype(object),
+            pd.Series(df['溫泉標章']).astype(object),
+            pd.Series(room_size_buckets(df['房間數'])),
+            pd.Series(df['縣市']).astype(object),
+        ]
+        codes, self.labels = [], []
+        for values in axes:
+            # 缺值也視為一個分類，總數才會與資料筆數一致
+            axis_codes, uniques = pd.factorize(values.fillna(""), sort=True)
+            codes.append(axis_codes)
+            self.labels.append(list(uniques))
+        shape = tuple(len(labels) for labels in self.labels)
+        flat = np.ravel_multi_index(codes, shape) if len(df) else np.empty(0, dtype=np.int64)
+        self.cube = np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape)
+        self.star_marks = np.array(["星級" in str(mark) for mark in self.labels[0]], dtype=bool)
+
+    def _select(self, axis, value):
+        """單一分類值在該軸上的布林選擇（值不存在時全部為 False）"""
+        return np.array([label == value for label in self.labels[axis]], dtype=bool)
+
+    def count(self, star=None, hot_spring=False, room_size=None, star_only=True, county=None):
+        """與 FilterIndex.compose 相同條件的符合筆數；county 指定縣市"""
+        return int(self.select(star, hot_spring, room_size, star_only, county).sum())
+
+    def select(self, star=None, hot_spring=False, room_size=None, star_only=True, county=None):
+        """依條件切出的子立方體（保留四個維度）"""
+        marks = self.star_marks.copy() if star_only else np.ones(len(self.labels[0]), dtype=bool)
+        if star is not None:
+            marks &= self._select(0, star)
+        cube = self.cube[marks]
+        if hot_spring:
+            cube = cube[:, self._select(1, '是')]
+        if room_size is not None:
+            cube = cube[:, :, self._select(2, room_size)]
+        if county is not None:
+            cube = cube[:, :, :, self._select(3, county)]
+        return cube
+
+    def by_county(self, star=None, hot_spring=False, room_size=None, star_only=True):
+        """各縣市的符合筆數（pandas Series，索引為縣市）"""
+        cube = self.select(star, hot_spring, room_size, star_only)
+        return pd.Series(cube.sum(axis=(0, 1, 2)), index=self.labels[3], name="飯店數")
@@ -0,0 +1,342 @@
+"""地理編碼：離線地名表、持久化快取
+
+Gazetteer 以隨附的 gazetteer.csv 將縣市、縣市+鄉鎮、郵遞區號解析為中心點座標，
+不需網路；資料表由 hotel_with_latlng.csv 的「縣市 / 鄉鎮 / 郵遞區號」欄位產生：
+
+    python hotel_finder_geocode.py
+
+因此只涵蓋資料中有飯店的行政區（並非全台完整清單），其餘地名由 Nominatim 查詢。
+
+GeocodeCache 以 SQLite 儲存「正規化地址 → 經緯度」，重新啟動程式後仍然有效，
+同一台機器上的所有 Streamlit session 與 tkinter 視窗共用同一個檔案。
+- 成功結果保存 ttl 秒，查無結果（負面快取）只保存 negative_ttl 秒
+- 超過 max_entries 筆時，依最後存取時間淘汰最久未使用的資料（LRU）
+- hits / misses 計數器可用 stats() 取得
+
+GeocodeScheduler 以執行緒池同時查詢多個地點，相同地點只查一次，
+線上查詢則透過 RateLimiter 限制每秒請求數（Nominatim 使用政策為每秒 1 次）。
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+GEOCODE_CACHE_FILE = os.environ.get("HOTEL_FINDER_GEOCODE_CACHE", "geocode_cache.sqlite3")
+GEOCODE_RATE_LIMIT = float(os.environ.get("HOTEL_FINDER_GEOCODE_RPS", "1"))
+GAZETTEER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gazetteer.csv")
+HOTEL_CSV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hotel_with_latlng.csv")
+
+
+def normalize_address(address):
+    """正規化地址字串作為快取鍵：全形轉半形、統一「臺/台」、去除多餘空白並轉小寫"""
+    text = unicodedata.normalize("NFKC", str(address))
+    text = text.replace("臺", "台")
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.lower()
+
+
+def _gazetteer_key(address):
+    """地名表查詢鍵：在快取鍵之外再去除標點與「台灣」前綴"""
+    text = normalize_address(address)
+    text = re.sub(r"[\s,，、]", "", text)
+    for prefix in ("taiwan", "台灣"):
+        if text.startswith(prefix):
+            text = text[len(prefix):]
+    for suffix in ("taiwan", "台灣"):
+        if text.endswith(suffix):
+            text = text[:-len(suffix)]
+    return text
+
+
+class Gazetteer:
+    """離線地名表：縣市 / 鄉鎮 / 郵遞區號 → 中心點座標"""
+
+    def __init__(self, table):
+        self.table = table
+        self._points = {
+            _gazetteer_key(name): (float(lat), float(lng))
+            for name, lat, lng in zip(table['名稱'], table['緯度'], table['經度'])
+        }
+
+    @classmethod
+    def from_hotels(cls, df):
+        """以飯店資料各行政區的座標平均值作為中心點"""
+        df = df.assign(
+            lat=pd.to_numeric(df['lat'], errors='coerce'),
+            lng=pd.to_numeric(df['lng'], errors='coerce'),
+        ).dropna(subset=['lat', 'lng'])
+        df = df.assign(
+            縣市=df['縣市'].astype(str).str.strip(),
+            鄉鎮=df['鄉鎮'].astype(str).str.strip(),
+            郵遞區號=pd.to_numeric(df['郵遞區號'], errors='coerce').astype('Int64').astype(str),
+        )
+
+        def centroids(keys, level):
+            grouped = df.groupby(keys)[['lat', 'lng']].agg(['mean', 'size'])
+            names = grouped.index.map(lambda k: "".join(k) if isinstance(k, tuple) else k)
+            return pd.DataFrame({
+                '名稱': names,
+                '層級': level,
+                '緯度': grouped[('lat', 'mean')].round(6).to_numpy(),
+                '經度': grouped[('lng', 'mean')].round(6).to_numpy(),
+                '飯店數': grouped[('lat', 'size')].to_numpy(),
+            })
+
+        counties = centroids('縣市', '縣市')
+        towns = centroids(['縣市', '鄉鎮'], '鄉鎮')
+        zips = centroids('郵遞區號', '郵遞區號')
+        zips = zips[zips['名稱'] != '<NA>']
+
+        # 單獨的鄉鎮名稱只收錄不會混淆的（「區」常在多個縣市重複，例如中正區、東區）
+        town_only = centroids('鄉鎮', '鄉鎮')
+        town_counties = df.groupby('鄉鎮')['縣市'].nunique()
+        town_only = town_only[
+            (town_only['名稱'].map(town_counties) == 1)
+            & ~town_only['名稱'].str.endswith('區')
+        ]
+
+        table = pd.concat([counties, towns, town_only, zips], ignore_index=True)
+        table = table.drop_duplicates(subset='名稱', keep='first').reset_index(drop=True)
+        return cls(table)
+
+    @classmethod
+    def load(cls, path=GAZETTEER_FILE):
+        table = pd.read_csv(path, encoding="utf-8", dtype={'名稱': str})
+        return cls(table)
+
+    def save(self, path=GAZETTEER_FILE):
+        self.table.to_csv(path, index=False, encoding="utf-8")
+
+    def lookup(self, address):
+        """查詢地名表，未收錄時回傳 None"""
+        return self._points.get(_gazetteer_key(address))
+
+
+def load_gazetteer(path=GAZETTEER_FILE, hotel_csv=HOTEL_CSV_FILE):
+    """載入隨附的地名表；檔案不存在時改由飯店資料即時產生"""
+    if os.path.exists(path):
+        return Gazetteer.load(path)
+    if os.path.exists(hotel_csv):
+        return Gazetteer.from_hotels(pd.read_csv(hotel_csv, encoding="utf-8"))
+    return None
+
+
+class GeocodeCache:
+    """SQLite 地理編碼快取（執行緒安全，可跨行程共用）"""
+
+    def __init__(self, path=GEOCODE_CACHE_FILE, ttl=30 * 24 * 3600,
+                 negative_ttl=10 * 60, max_entries=50000):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS geocode ("
+            " key TEXT PRIMARY KEY, lat REAL, lng REAL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS geocode_accessed ON geocode (accessed)")
+        self._conn.commit()
+
+    def get(self, address):
+        """查詢快取，回傳 (是否命中, 座標或 None)"""
+        key = normalize_address(address)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT lat, lng, created FROM geocode WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                lat, lng, created = row
+                ttl = self.ttl if lat is not None else self.negative_ttl
+                if now - created <= ttl:
+                    self._conn.execute("UPDATE geocode SET accessed = ? WHERE key = ?", (now, key))
+                    self._conn.commit()
+                    self.hits += 1
+                    return True, (lat, lng) if lat is not None else None
+                self._conn.execute("DELETE FROM geocode WHERE key = ?", (key,))
+                self._conn.commit()
+            self.misses += 1
+            return False, None
+
+    def put(self, address, latlng):
+        """寫入快取；latlng 為 None 時記錄為查無結果"""
+        key = normalize_address(address)
+        lat, lng = latlng if latlng is not None else (None, None)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocode (key, lat, lng, created, accessed)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, lat, lng, now, now),
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM geocode WHERE key IN"
+                    " (SELECT key FROM geocode ORDER BY accessed ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def lookup(self, address, resolver):
+        """先查快取，未命中時呼叫 resolver(address) 並寫回快取
+
+        resolver 拋出的例外（網路錯誤、被限流等）不會被快取。
+        """
+        hit, latlng = self.get(address)
+        if hit:
+            return latlng
+        latlng = resolver(address)
+        self.put(address, latlng)
+        return latlng
+
+    def stats(self):
+        """回傳快取命中統計"""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": size,
+        }
+
+
+def nominatim_resolver(geolocator, suffix=""):
+    """建立以 Nominatim 查詢經緯度的 resolver"""
+    def resolve(address):
+        location = geolocator.geocode(address + suffix)
+        if location:
+            return (location.latitude, location.longitude)
+        return None
+    return resolve
+
+
+class RateLimiter:
+    """限制每秒請求數的簡易節流器（執行緒安全）"""
+
+    def __init__(self, rate_per_second=GEOCODE_RATE_LIMIT):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        """預約下一個可用時段，必要時休眠到該時段"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def rate_limited(resolver, limiter):
+    """包裝 resolver，每次線上查詢前先取得節流時段"""
+    def resolve(address):
+        limiter.wait()
+        return resolver(address)
+    return resolve
+
+
+class Geocoder:
+    """地理編碼流程：離線地名表 → 持久化快取 → 線上查詢（Nominatim）"""
+
+    def __init__(self, gazetteer, cache, resolver):
+        self.gazetteer = gazetteer
+        self.cache = cache
+        self.resolver = resolver
+        self.offline_hits = 0
+
+    def geocode(self, address):
+        if self.gazetteer is not None:
+            latlng = self.gazetteer.lookup(address)
+            if latlng is not None:
+                self.offline_hits += 1
+                return latlng
+        return self.cache.lookup(address, self.resolver)
+
+    def geocode_offline(self, address):
+        """只查離線地名表與快取，不發出線上請求；都沒有時回傳 None（不寫入負面快取）"""
+        if self.gazetteer is not None:
+            latlng = self.gazetteer.lookup(address)
+            if latlng is not None:
+                self.offline_hits += 1
+                return latlng
+        return self.cache.get(address)[1]
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats["offline_hits"] = self.offline_hits
+        return stats
+
+
+class GeocodeScheduler:
+    """多地點同時查詢：執行緒池 + 相同地點去重
+
+    同一地點若已有查詢進行中（包含其他 session 發出的），直接共用同一個結果。
+    """
+
+    def __init__(self, geocoder, max_workers=8):
+        self.geocoder = geocoder
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="geocode")
+        # 查詢若在登記回呼前就已完成，回呼會在同一執行緒內立即執行，因此使用 RLock
+        self._lock = threading.RLock()
+        self._inflight = {}
+
+    def submit(self, address):
+        key = normalize_address(address)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._executor.submit(self.geocoder.geocode, address)
+                self._inflight[key] = future
+                future.add_done_callback(lambda _f, key=key: self._forget(key))
+        return future
+
+    def _forget(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def geocode_many(self, addresses):
+        """依完成順序逐一產出 (地點, 座標或 None, 例外或 None)，重複的地點只查詢一次"""
+        futures = {}
+        for address in dict.fromkeys(addresses):
+            futures.setdefault(self.submit(address), []).append(address)
+        for future in as_completed(futures):
+            error = future.exception()
+            for address in futures[future]:
+                yield address, (None if error else future.result()), error
+
+
+def geocode_each(addresses, geocode, executor):
+    """以執行緒池同時解析一批地址，回傳 ([(地址, 座標或 None)], 地理編碼失敗的地址)
+
+    geocode 可為 Geocoder.geocode 或只查離線資料的 Geocoder.geocode_offline。
+    """
+    futures = [executor.submit(geocode, address) for address in addresses]
+    located, failed = [], []
+    for address, future in zip(addresses, futures):
+        if future.exception() is not None:
+            failed.append(address)
+        else:
+            located.append((address, future.result()))
+    return located, failed
+
+
+if __name__ == "__main__":
+    gazetteer = Gazetteer.from_hotels(pd.read_csv(HOTEL_CSV_FILE, encoding="utf-8"))
+    gazetteer.save()
+    print(f"已產生 {GAZETTEER_FILE}：{len(gazetteer.table)} 筆地名")
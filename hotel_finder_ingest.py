@@ -0,0 +1,160 @@
+"""旅宿登記資料增量匯入
+
+觀光署公布新版旅宿登記資料後，以「縣市旅宿登記證號」與目前的 hotel_with_latlng.csv 比對：
+- 新增、地址變更、以及目前仍缺座標的旅宿才地理編碼（經過持久化快取，已查過的地址不會再查）
+- 地址未變更的旅宿沿用原本的 lat / lng
+- 寫入新的 CSV（先寫暫存檔再換名）並重建欄式資料檔
+
+    python hotel_finder_ingest.py 新版旅宿登記.csv [--csv hotel_with_latlng.csv] [--online] [--dry-run]
+
+執行中的 Streamlit 與 API 會偵測到資料集版本（dataset_version）改變，
+直接由新的資料檔載入新版資料集，不需重新啟動；地理編碼快取仍然有效。
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from hotel_finder_dataset import build_dataset_artifact
+from hotel_finder_geocode import (
+    GeocodeCache, Geocoder, RateLimiter, geocode_each, load_gazetteer, nominatim_resolver,
+    normalize_address, rate_limited,
+)
+
+CSV_FILE = "hotel_with_latlng.csv"
+REGISTRY_KEY = '縣市旅宿登記證號'
+COORD_COLUMNS = ['lat', 'lng']
+
+
+def registry_keys(df):
+    """比對鍵：登記證號 + 同證號的出現序號（原始資料偶有重複的登記證號）"""
+    key = df[REGISTRY_KEY].astype(str).str.strip()
+    return pd.Index(key + "#" + key.groupby(key).cumcount().astype(str))
+
+
+def diff_registry(current, new):
+    """比對兩版登記資料，回傳各類變更的比對鍵（pandas Index）
+
+    added：新增；removed：移除；moved：地址變更；updated：地址以外的欄位變更；unchanged：完全相同。
+    兩份資料應以 dtype=str 讀取，欄位值以原始文字比較。
+    """
+    current_keys, new_keys = registry_keys(current), registry_keys(new)
+    current = current.set_axis(current_keys)
+    new = new.set_axis(new_keys)
+    common = new_keys[new_keys.isin(current_keys)]
+
+    old_address = current.loc[common, '地址'].map(normalize_address)
+    new_address = new.loc[common, '地址'].map(normalize_address)
+    moved = common[(old_address != new_address).to_numpy()]
+
+    columns = [column for column in new.columns
+               if column in current.columns and column not in COORD_COLUMNS + ['地址']]
+    old_values = current.loc[common, columns].fillna("").astype(str)
+    new_values = new.loc[common, columns].fillna("").astype(str)
+    changed = (old_values != new_values).any(axis=1).to_numpy()
+    updated = common[changed & ~common.isin(moved)]
+
+    return {
+        "added": new_keys[~new_keys.isin(current_keys)],
+        "removed": current_keys[~current_keys.isin(new_keys)],
+        "moved": moved,
+        "updated": updated,
+        "unchanged": common[~changed & ~common.isin(moved)],
+    }
+
+
+def merge_registry(current, new, diff, geocode, max_workers=8):
+    """以新版資料為準，沿用未變更地址的座標，其餘地址重新地理編碼
+
+    回傳 (合併後的 DataFrame, 統計 dict)；地理編碼失敗或查無結果的旅宿座標留空，下次匯入時重試。
+    """
+    current = current.set_axis(registry_keys(current))
+    merged = new.set_axis(registry_keys(new)).copy()
+    for column in COORD_COLUMNS:
+        if column not in merged.columns:
+            merged[column] = np.nan
+        merged[column] = pd.to_numeric(merged[column], errors='coerce')
+
+    # 新版資料本身沒有座標時，地址未變更者沿用目前的座標
+    keep = merged.index.isin(diff["updated"].append(diff["unchanged"]))
+    carry = keep & merged[COORD_COLUMNS].isna().any(axis=1).to_numpy()
+    previous = current.loc[merged.index[carry], COORD_COLUMNS].apply(pd.to_numeric, errors='coerce')
+    merged.loc[carry, COORD_COLUMNS] = previous.to_numpy(dtype=float)
+
+    missing = merged[COORD_COLUMNS].isna().any(axis=1).to_numpy()
+    addresses = list(dict.fromkeys(merged.loc[missing, '地址'].dropna().astype(str)))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="geocode") as executor:
+        located, failed = geocode_each(addresses, geocode, executor)
+    found = {address: loc for address, loc in located if loc is not None}
+    if found:
+        rows = missing & merged['地址'].astype(str).isin(found).to_numpy()
+        coords = np.array([found[address] for address in merged.loc[rows, '地址'].astype(str)], dtype=float)
+        merged.loc[rows, COORD_COLUMNS] = coords.reshape(-1, 2)
+
+    stats = {
+        "geocoded": len(found),
+        "not_found": sum(loc is None for _, loc in located),
+        "failed": len(failed),
+        "missing_coords": int(merged[COORD_COLUMNS].isna().any(axis=1).sum()),
+    }
+    # 欄位順序與目前的 CSV 相同，新版多出的欄位放在最後
+    columns = [column for column in current.columns if column in merged.columns]
+    columns += [column for column in merged.columns if column not in columns]
+    return merged[columns].reset_index(drop=True), stats
+
+
+def write_registry(df, csv_path):
+    """寫入新的 CSV（先寫暫存檔再換名）並重建欄式資料檔"""
+    tmp_path = csv_path + ".tmp"
+    df.to_csv(tmp_path, index=False, encoding="utf-8")
+    os.replace(tmp_path, csv_path)
+    try:
+        build_dataset_artifact(csv_path)
+    except (OSError, RuntimeError) as e:
+        # 資料檔只是加速載入用，失敗時執行中的程式會改讀 CSV
+        print(f"無法重建欄式資料檔：{e}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="匯入新版旅宿登記資料（只地理編碼有變更的地址）")
+    parser.add_argument("registry", help="新版旅宿登記 CSV（UTF-8，需有「縣市旅宿登記證號」、「地址」欄）")
+    parser.add_argument("--csv", default=CSV_FILE, help="目前的飯店資料 CSV（匯入後覆寫）")
+    parser.add_argument("--online", action="store_true",
+                        help="快取查不到的地址查詢 Nominatim（受每秒請求數限制）")
+    parser.add_argument("--dry-run", action="store_true", help="只列出差異，不地理編碼也不寫入")
+    args = parser.parse_args(argv)
+
+    new = pd.read_csv(args.registry, encoding="utf-8-sig", dtype=str)
+    for column in (REGISTRY_KEY, '地址'):
+        if column not in new.columns:
+            parser.error(f"新版資料缺少「{column}」欄位")
+    current = pd.read_csv(args.csv, encoding="utf-8", dtype=str)
+
+    diff = diff_registry(current, new)
+    print(f"新增 {len(diff['added']):,}、移除 {len(diff['removed']):,}、地址變更 {len(diff['moved']):,}、"
+          f"其他欄位變更 {len(diff['updated']):,}、未變更 {len(diff['unchanged']):,}")
+    if args.dry_run:
+        return 0
+
+    resolver = None
+    if args.online:
+        from geopy.geocoders import Nominatim
+        resolver = rate_limited(
+            nominatim_resolver(Nominatim(user_agent="hotel_finder_ingest"), suffix=", Taiwan"),
+            RateLimiter(),
+        )
+    geocoder = Geocoder(load_gazetteer(), GeocodeCache(), resolver)
+    geocode = geocoder.geocode if args.online else geocoder.geocode_offline
+
+    merged, stats = merge_registry(current, new, diff, geocode)
+    write_registry(merged, args.csv)
+    print(f"地理編碼 {stats['geocoded']:,} 個地址（查無 {stats['not_found']:,}、失敗 {stats['failed']:,}），"
+          f"已寫入 {args.csv}：{len(merged):,} 筆，其中 {stats['missing_coords']:,} 筆缺座標")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""搜尋熱路徑的各階段耗時統計
+
+階段：load（載入資料）、geocode（地理編碼）、filter（篩選）、distance（距離計算與排序）、
+stats（比較統計）、render（畫面 / 回應輸出）、export（CSV 匯出）。
+來源（source）區分 streamlit、tkinter、api。
+
+每次計時只做 perf_counter、bisect 與一次加鎖的計數累加，可在正式環境長期開啟。
+累計結果為固定分桶的直方圖，以 Prometheus 文字格式輸出：
+- API 伺服器的 /metrics 端點
+- Streamlit 設定環境變數 HOTEL_FINDER_METRICS_PORT 時另外啟動的 /metrics 伺服器
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 直方圖分桶上限（秒），涵蓋亞毫秒的遮罩運算到數秒的線上地理編碼
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_NAME = "hotel_finder_stage_seconds"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """固定分桶直方圖（執行緒安全）"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最後一格為 +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    def quantile(self, q):
+        """以分桶內線性內插估計分位數（與 Prometheus histogram_quantile 相同）"""
+        counts, _, count = self.snapshot()
+        if count == 0:
+            return None
+        rank = q * count
+        seen = 0
+        for i, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+
+class StageMetrics:
+    """依 (來源, 階段) 分別累計的耗時直方圖"""
+
+    def __init__(self, name=METRIC_NAME, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.buckets = buckets
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage, source):
+        key = (source, stage)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(self.buckets))
+        return histogram
+
+    def observe(self, stage, seconds, source="app"):
+        self.histogram(stage, source).observe(seconds)
+
+    @contextmanager
+    def timer(self, stage, source="app"):
+        """計時 with 區塊；區塊內拋出例外時仍會記錄耗時"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, source)
+
+    def summary(self):
+        """各 (來源, 階段) 的次數、平均與 p50 / p95（毫秒），供偵錯面板顯示"""
+        rows = []
+        for (source, stage), histogram in sorted(self._histograms.items()):
+            _, total, count = histogram.snapshot()
+            rows.append({
+                "來源": source,
+                "階段": stage,
+                "次數": count,
+                "平均(ms)": round(total / count * 1000, 2) if count else None,
+                "p50(ms)": round(histogram.quantile(0.5) * 1000, 2) if count else None,
+                "p95(ms)": round(histogram.quantile(0.95) * 1000, 2) if count else None,
+            })
+        return rows
+
+    def prometheus_text(self):
+        """Prometheus 文字格式（histogram）"""
+        lines = [
+            f"# HELP {self.name} Per-stage latency of hotel searches in seconds.",
+            f"# TYPE {self.name} histogram",
+        ]
+        for (source, stage), histogram in sorted(self._histograms.items()):
+            counts, total, count = histogram.snapshot()
+            labels = f'source="{source}",stage="{stage}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return "\n".join(lines) + "\n"
+
+
+# 整個行程共用的統計（Streamlit 每次重新執行腳本時仍是同一份）
+METRICS = StageMetrics()
+
+
+def stage_timer(stage, source="app"):
+    return METRICS.timer(stage, source)
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.metrics.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Prometheus 定期抓取，不輸出存取紀錄
+
+
+def start_metrics_server(port, host="0.0.0.0", metrics=METRICS):
+    """在背景 daemon 執行緒啟動只提供 /metrics 的 HTTP 伺服器"""
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    server.metrics = metrics
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,104 @@
+"""綜合評分排序：距離、星級、溫泉、房間數加權
+
+載入資料時一次建立每間飯店的評分特徵矩陣（RankingFeatures），各特徵都正規化到 0 ~ 1：
+- 星級：由標章解析（一星 ~ 五星為 1 ~ 5，「卓越」再加 1），除以 STAR_TIER_MAX
+- 溫泉：有溫泉標章為 1
+- 房間數：log(1 + 房間數) / log(1 + 全部飯店的最大房間數)，無法解析者為 0
+
+查詢時距離分數為 1 - 距離 / 搜尋半徑，所有候選的分數以一次矩陣乘法算出：
+    分數 = (w_距離 × 距離分數 + 特徵[候選] @ [w_星級, w_溫泉, w_房間數]) / 權重總和
+再以 argpartition 部分選取前 k 名，只排序這 k 筆（O(M + k log k)）。
+分數相同時依距離、再依原始列順序排列；結果的「評分」欄為 0 ~ 100 分。
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+# 權重名稱 → 側邊欄顯示文字
+RANKING_CRITERIA = {
+    "distance": "📏 距離近",
+    "star": "⭐ 星級高",
+    "hot_spring": "♨️ 溫泉",
+    "rooms": "🏢 房間數多",
+}
+DEFAULT_WEIGHTS = {"distance": 3.0, "star": 2.0, "hot_spring": 1.0, "rooms": 1.0}
+
+STAR_NUMERALS = "一二三四五"
+STAR_TIER_MAX = len(STAR_NUMERALS) + 1
+
+
+def star_tier(mark):
+    """標章的星級分數：一星 ~ 五星為 1 ~ 5，「卓越」標章再加 1；無法解析者為 0"""
+    match = re.search(f"([{STAR_NUMERALS}])星", str(mark))
+    if match is None:
+        return 0
+    return STAR_NUMERALS.index(match.group(1)) + 1 + ("卓越" in str(mark))
+
+
+class RankingFeatures:
+    """每間飯店的 (星級, 溫泉, 房間數) 評分特徵，建立一次後唯讀共用"""
+
+    def __init__(self, df):
+        # 標章為分類欄位，只需解析每一種值一次
+        codes, uniques = pd.factorize(pd.Series(df['標章']).astype(object).fillna(""))
+        tiers = np.array([star_tier(mark) for mark in uniques], dtype=np.float32)
+        star = tiers[codes] / STAR_TIER_MAX if len(uniques) else np.zeros(len(df), dtype=np.float32)
+
+        hot_spring = pd.Series(df['溫泉標章']).astype(object).eq('是').to_numpy(dtype=np.float32)
+
+        rooms = pd.to_numeric(pd.Series(df['房間數']), errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        rooms = np.log1p(np.clip(np.nan_to_num(rooms, nan=0.0), 0.0, None))
+        top = rooms.max() if len(rooms) else 0.0
+        rooms = rooms / top if top > 0 else np.zeros_like(rooms)
+
+        self.matrix = np.column_stack([star, hot_spring, rooms]).astype(np.float32)
+        self.matrix.setflags(write=False)
+
+    def scores(self, positions, distances, weights, radius_km):
+        """候選飯店的綜合評分（0 ~ 1）；weights 為 {權重名稱: 權重}，缺少的權重視為 0"""
+        w = np.array([max(float(weights.get(name, 0.0)), 0.0) for name in RANKING_CRITERIA])
+        total = w.sum()
+        if total == 0:
+            # 權重全為 0 時退回只依距離排序
+            w, total = np.array([1.0, 0.0, 0.0, 0.0]), 1.0
+        closeness = 1.0 - np.clip(np.asarray(distances, dtype=float) / max(float(radius_km), 1e-9), 0.0, 1.0)
+        return (w[0] * closeness + self.matrix[positions] @ w[1:]) / total
+
+
+def top_k(scores, distances, positions, k=None):
+    """分數最高的前 k 名（部分選取），回傳依分數由高到低排列的索引；k 為 None 時全部排序"""
+    if k is not None and k < len(scores):
+        k = max(int(k), 0)
+        selected = np.argpartition(-scores, k - 1)[:k] if k else np.empty(0, dtype=np.int64)
+    else:
+        selected = np.arange(len(scores))
+    # 分數相同（四捨五入到小數第 6 位）時依距離、再依原始列順序
+    order = np.lexsort((positions[selected], np.round(distances[selected], 2),
+                        -np.round(scores[selected], 6)))
+    return selected[order]
+
+
+def rank_candidates(features, positions, distances, weights, radius_km, k=None):
+    """單一查詢點的候選飯店評分排序，回傳 (positions, distances, scores)"""
+    scores = features.scores(positions, distances, weights, radius_km)
+    best = top_k(scores, distances, positions, k)
+    return positions[best], distances[best], scores[best]
+
+
+def rank_candidates_many(features, query_ids, positions, distances, weights, radius_km, k=None):
+    """多查詢點的候選飯店評分排序（長表，依 query_ids 分組）
+
+    所有候選的分數一次算出，再於各查詢點的連續區段內部分選取前 k 名；
+    回傳 (query_ids, positions, distances, scores)，依查詢點、再依分數由高到低排列。
+    """
+    order = np.argsort(query_ids, kind='stable')
+    query_ids, positions, distances = query_ids[order], positions[order], distances[order]
+    scores = features.scores(positions, distances, weights, radius_km)
+    bounds = np.flatnonzero(np.diff(query_ids)) + 1
+    starts = np.concatenate([[0], bounds]) if len(query_ids) else np.empty(0, dtype=np.int64)
+    ends = np.concatenate([bounds, [len(query_ids)]]) if len(query_ids) else np.empty(0, dtype=np.int64)
+    parts = [start + top_k(scores[start:end], distances[start:end], positions[start:end], k)
+             for start, end in zip(starts, ends)]
+    keep = np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+    return query_ids[keep], positions[keep], distances[keep], scores[keep]
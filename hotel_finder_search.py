@@ -0,0 +1,264 @@
+"""飯店搜尋流程（Streamlit、HTTP API 共用）
+
+以共用的 HotelDataset 執行單地點 / 多地點半徑搜尋與多地點比較統計，
+不依賴任何 UI 套件，呼叫端只需提供篩選遮罩與查詢座標。
+
+SearchResultCache 是跨 session 共用的搜尋結果快取：
+- 單地點的鍵為四捨五入到小數第 5 位（約 1 公尺）的座標 + 正規化的篩選條件 + 半徑
+- 多地點比較的鍵為依輸入順序的 (地點, 座標) + 篩選條件 + 半徑，快取整份長表
+- 依筆數與資料表佔用的位元組數限制大小，超過時淘汰最久未使用的結果（LRU）
+- 結果保存 ttl 秒；資料集版本（HotelDataset.version）改變時整個清空
+
+read_place_list 解析批次比較上傳的地點清單（CSV / TXT）。
+
+search_ranked / search_ranked_many 為綜合評分模式：半徑內的候選飯店依加權分數排序取前 k 名
+（見 hotel_finder_ranking），結果多一個「評分」欄。
+
+search_text 以旅宿名稱、地址的 n-gram 索引（HotelDataset.text）做輸入即搜尋。
+"""
+import csv
+import io
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from hotel_finder_engine import build_hotel_frame, find_within_radius_many
+from hotel_finder_ranking import rank_candidates, rank_candidates_many
+
+# CSV 地點清單依序優先採用的欄位名稱，都沒有時取第一欄
+PLACE_COLUMNS = ("地點", "地址", "place", "address")
+
+
+def read_place_list(data, filename=""):
+    """解析上傳的地點清單（UTF-8、UTF-8 BOM 或 Big5 編碼）
+
+    .csv 檔有「地點」、「地址」等標題欄時取該欄，否則取第一欄；其他檔案每行一個地點。
+    回傳去除空白與重複後、依原順序排列的地點清單。
+    """
+    for encoding in ("utf-8-sig", "cp950"):
+        try:
+            text = data.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise ValueError("無法辨識檔案編碼，請使用 UTF-8 或 Big5")
+    if filename.lower().endswith(".csv"):
+        rows = list(csv.reader(io.StringIO(text)))
+        header = [cell.strip() for cell in rows[0]] if rows else []
+        column = next((header.index(name) for name in PLACE_COLUMNS if name in header), None)
+        if column is None:
+            column = 0
+        else:
+            rows = rows[1:]
+        places = [row[column] for row in rows if len(row) > column]
+    else:
+        places = text.splitlines()
+    return list(dict.fromkeys(place.strip() for place in places if place.strip()))
+
+
+def search_location(dataset, loc, filter_mask, radius_km, include_coords=True, sorted_distances=None):
+    """單地點搜尋：透過空間索引只查詢鄰近網格，再限制於符合篩選遮罩的飯店
+
+    提供同一地點的 SortedDistances 時，改為二分搜尋 + 遮罩交集（結果相同）。
+    """
+    if sorted_distances is not None:
+        positions, distances = sorted_distances.query_radius(radius_km, filter_mask)
+    else:
+        positions, distances = dataset.spatial.query_radius(loc, radius_km, filter_mask)
+    return build_hotel_frame(dataset.frame, positions, distances, include_coords=include_coords)
+
+
+def search_locations(dataset, location_coords, filter_mask, radius_km):
+    """多地點批次搜尋：一次距離矩陣計算所有地點，回傳含「搜尋地點」欄位的長表
+
+    location_coords 為 {地點: 座標或 None}，座標為 None 的地點不參與搜尋。
+    """
+    located = [(location, loc) for location, loc in location_coords.items() if loc is not None]
+    pool = np.flatnonzero(filter_mask)
+    query_ids, positions, distances = find_within_radius_many(
+        [loc for _, loc in located], dataset.lats[pool], dataset.lngs[pool], radius_km)
+    hits = build_hotel_frame(dataset.frame, pool[positions], distances)
+    names = np.array([location for location, _ in located] or [""], dtype=object)
+    hits['搜尋地點'] = names[query_ids]
+    return hits
+
+
+def search_nearest(dataset, loc, filter_mask, k, max_km=None, include_coords=True,
+                   sorted_distances=None):
+    """單地點最近 k 間搜尋（空間索引逐步擴大範圍），max_km 為最遠距離上限"""
+    if sorted_distances is not None:
+        positions, distances = sorted_distances.query_nearest(k, filter_mask, max_km=max_km)
+    else:
+        positions, distances = dataset.spatial.query_nearest(loc, k, filter_mask, max_km=max_km)
+    return build_hotel_frame(dataset.frame, positions, distances, include_coords=include_coords)
+
+
+def search_nearest_many(dataset, location_coords, filter_mask, k, max_km=None):
+    """多地點最近 k 間搜尋，回傳與 search_locations 相同格式的長表"""
+    located = [(location, loc) for location, loc in location_coords.items() if loc is not None]
+    parts = [dataset.spatial.query_nearest(loc, k, filter_mask, max_km=max_km) for _, loc in located]
+    positions = np.concatenate([p for p, _ in parts]) if parts else np.empty(0, dtype=np.int64)
+    distances = np.concatenate([d for _, d in parts]) if parts else np.empty(0)
+    hits = build_hotel_frame(dataset.frame, positions, distances)
+    hits['搜尋地點'] = np.repeat(
+        np.array([location for location, _ in located], dtype=object),
+        [len(p) for p, _ in parts],
+    )
+    return hits
+
+
+def _with_scores(hits, scores):
+    """在「距離(公里)」欄之後加入 0 ~ 100 分的「評分」欄"""
+    hits.insert(hits.columns.get_loc('距離(公里)') + 1, '評分', np.round(scores * 100.0, 1))
+    return hits
+
+
+def search_ranked(dataset, loc, filter_mask, radius_km, weights, k=None, include_coords=True,
+                  sorted_distances=None):
+    """單地點綜合評分搜尋：半徑內符合篩選的飯店依加權分數取前 k 名（k 為 None 時全部排序）"""
+    if sorted_distances is not None:
+        positions, distances = sorted_distances.query_radius(radius_km, filter_mask)
+    else:
+        positions, distances = dataset.spatial.query_radius(loc, radius_km, filter_mask)
+    positions, distances, scores = rank_candidates(dataset.ranking, positions, distances,
+                                                   weights, radius_km, k)
+    hits = build_hotel_frame(dataset.frame, positions, distances, include_coords=include_coords)
+    return _with_scores(hits, scores)
+
+
+def search_ranked_many(dataset, location_coords, filter_mask, radius_km, weights, k=None):
+    """多地點綜合評分搜尋，回傳與 search_locations 相同格式（多「評分」欄）的長表"""
+    located = [(location, loc) for location, loc in location_coords.items() if loc is not None]
+    pool = np.flatnonzero(filter_mask)
+    query_ids, positions, distances = find_within_radius_many(
+        [loc for _, loc in located], dataset.lats[pool], dataset.lngs[pool], radius_km)
+    query_ids, positions, distances, scores = rank_candidates_many(
+        dataset.ranking, query_ids, pool[positions], distances, weights, radius_km, k)
+    hits = _with_scores(build_hotel_frame(dataset.frame, positions, distances), scores)
+    names = np.array([location for location, _ in located] or [""], dtype=object)
+    hits['搜尋地點'] = names[query_ids]
+    return hits
+
+
+def search_text(dataset, query, filter_mask=None, limit=None, include_coords=True):
+    """名稱 / 地址搜尋：回傳依相符程度排列的飯店資料表（沒有距離欄）"""
+    positions, _ = dataset.text.search(query, filter_mask, limit=limit)
+    hits = build_hotel_frame(dataset.frame, positions, np.full(len(positions), np.nan),
+                             include_coords=include_coords)
+    return hits.drop(columns='距離(公里)')
+
+
+def comparison_stats(location_coords, comparison_hits):
+    """多地點比較統計（對長表結果做一次 groupby）"""
+    locations = list(location_coords)
+    grouped = comparison_hits.assign(
+        是否五星=comparison_hits['星級標章'].astype(str).str.contains('五星'),
+        是否溫泉=comparison_hits['溫泉'] == '♨️',
+    ).groupby('搜尋地點', sort=False)
+    stats = pd.DataFrame({
+        "飯店總數": grouped.size(),
+        "五星飯店": grouped['是否五星'].sum(),
+        "溫泉飯店": grouped['是否溫泉'].sum(),
+        "平均距離": grouped['距離(公里)'].mean().round(1),
+        "最近距離": grouped['距離(公里)'].min(),
+    }).reindex(locations, fill_value=0)
+    stats.insert(0, "地點", locations)
+    # 沒有找到飯店的地點不顯示座標
+    stats["座標"] = [
+        location_coords[location] if total else None
+        for location, total in zip(locations, stats['飯店總數'])
+    ]
+    return stats.reset_index(drop=True)
+
+
+class SearchResultCache:
+    """跨 session 共用的搜尋結果 LRU 快取（執行緒安全）
+
+    快取的 DataFrame 由所有呼叫端共用，取得後只能讀取、不可修改。
+    """
+
+    def __init__(self, max_entries=512, max_bytes=64 * 1024 * 1024, ttl=3600, precision=5):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.precision = precision
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()  # 鍵 → (建立時間, 結果, 位元組數)
+        self._lock = threading.Lock()
+
+    def key(self, loc, filters, radius_km, *extra):
+        """座標四捨五入後與篩選條件組成快取鍵；filters 為 (星級標章, 是否溫泉, 規模代碼)"""
+        lat, lng = (round(float(value), self.precision) for value in loc)
+        return (lat, lng, tuple(filters), float(radius_km)) + extra
+
+    def key_many(self, location_coords, filters, radius_km, *extra):
+        """多地點比較的快取鍵：location_coords 為 {地點: 座標或 None}，順序會影響結果因此納入鍵"""
+        places = tuple(
+            (place, None if loc is None else tuple(round(float(value), self.precision) for value in loc))
+            for place, loc in location_coords.items()
+        )
+        return (places, tuple(filters), float(radius_km)) + extra
+
+    def lookup(self, version, key, compute):
+        """查詢快取，未命中時呼叫 compute() 並寫回；version 為資料集版本"""
+        now = time.monotonic()
+        with self._lock:
+            if version != self.version:
+                self._clear()
+                self.version = version
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._discard(key)
+            self.misses += 1
+
+        # 計算時不持有鎖，同一個鍵同時未命中時可能重複計算，但結果相同
+        result = compute()
+        nbytes = int(result.memory_usage(deep=True).sum())
+        with self._lock:
+            if version != self.version or nbytes > self.max_bytes:
+                return result
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = (now, result, nbytes)
+            self.nbytes += nbytes
+            while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+        return result
+
+    def _discard(self, key):
+        _, _, nbytes = self._entries.pop(key)
+        self.nbytes -= nbytes
+
+    def _clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def stats(self):
+        """回傳快取命中統計"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.nbytes,
+            }
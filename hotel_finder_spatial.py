@@ -0,0 +1,207 @@
+"""飯店座標的網格空間索引
+
+將全台飯店依經緯度切成固定大小的網格（預設 0.05 度，約 5 公里），
+以 CSR 方式儲存每個網格內的飯店位置。半徑查詢只需讀取查詢點周圍的網格，
+查詢成本隨命中數量成長，而非隨整份旅宿登記資料的筆數成長。
+
+最近 N 間查詢從約一個網格的半徑開始，找不到足夠的飯店時半徑加倍，
+直到找到 k 間、達到最遠距離上限或涵蓋所有網格為止。
+
+SortedDistances 是單一查詢點到所有飯店、由近到遠排序的距離陣列。同一地點改變半徑或篩選條件時，
+只需二分搜尋找出半徑內的前綴，再與篩選遮罩取交集，不必重新地理編碼或重新計算距離；
+查詢結果與 GridIndex 完全相同。
+"""
+import numpy as np
+
+from hotel_finder_engine import (
+    HAVERSINE_REL_TOLERANCE, find_nearest, find_within_radius, haversine_km, refine_geodesic,
+)
+
+# 每緯度約 111 公里（取略小值，確保網格範圍保守涵蓋半徑）
+KM_PER_DEG_LAT = 110.5
+
+# 地球半周長，最近 N 間查詢的半徑超過此值時直接掃描全部飯店
+HALF_EARTH_KM = 20_038.0
+
+# SortedDistances 以 float32 儲存距離，二分搜尋時放寬的相對誤差（float32 約 6e-8）
+FLOAT32_REL_MARGIN = 1e-6
+
+
+class GridIndex:
+    """經緯度均勻網格索引，建立一次後唯讀共用"""
+
+    def __init__(self, lats, lngs, cell_deg=0.05):
+        # 保留原本的 dtype（可為 float32），距離計算時才轉為 float64
+        self.lats = np.asarray(lats)
+        self.lngs = np.asarray(lngs)
+        self.size = len(self.lats)
+        self.cell_deg = cell_deg
+
+        valid = np.flatnonzero(np.isfinite(self.lats) & np.isfinite(self.lngs))
+        self.valid = valid
+        if len(valid) == 0:
+            self.lat0 = self.lng0 = 0.0
+            self.n_rows = self.n_cols = 1
+            self.cell_keys = np.empty(0, dtype=np.int64)
+            self.cell_starts = np.zeros(1, dtype=np.int64)
+            self.order = np.empty(0, dtype=np.int64)
+            return
+
+        self.lat0 = float(self.lats[valid].min())
+        self.lng0 = float(self.lngs[valid].min())
+        rows = self._row_of(self.lats[valid])
+        cols = self._col_of(self.lngs[valid])
+        self.n_rows = int(rows.max()) + 1
+        self.n_cols = int(cols.max()) + 1
+
+        # 依網格編號排序，相同網格的飯店位置連續存放
+        keys = rows * self.n_cols + cols
+        sort = np.argsort(keys, kind='stable')
+        self.order = valid[sort]
+        self.cell_keys, starts = np.unique(keys[sort], return_index=True)
+        self.cell_starts = np.append(starts, len(sort)).astype(np.int64)
+
+    def _row_of(self, lats):
+        return np.floor((np.asarray(lats, dtype=np.float64) - self.lat0) / self.cell_deg).astype(np.int64)
+
+    def _col_of(self, lngs):
+        return np.floor((np.asarray(lngs, dtype=np.float64) - self.lng0) / self.cell_deg).astype(np.int64)
+
+    def candidates(self, origin, radius_km):
+        """回傳查詢點半徑範圍所涵蓋網格內的所有飯店位置"""
+        reach_km = radius_km * (1.0 + HAVERSINE_REL_TOLERANCE)
+        dlat = reach_km / KM_PER_DEG_LAT
+        max_lat = min(abs(origin[0]) + dlat, 89.0)
+        dlng = reach_km / (KM_PER_DEG_LAT * np.cos(np.radians(max_lat)))
+
+        row_lo = max(int(self._row_of(origin[0] - dlat)), 0)
+        row_hi = min(int(self._row_of(origin[0] + dlat)), self.n_rows - 1)
+        col_lo = max(int(self._col_of(origin[1] - dlng)), 0)
+        col_hi = min(int(self._col_of(origin[1] + dlng)), self.n_cols - 1)
+        if row_lo > row_hi or col_lo > col_hi:
+            return np.empty(0, dtype=np.int64)
+
+        # 查詢範圍涵蓋的網格比實際有資料的網格還多時，直接回傳全部
+        n_box = (row_hi - row_lo + 1) * (col_hi - col_lo + 1)
+        if n_box >= len(self.cell_keys):
+            return self.valid
+
+        rows = np.arange(row_lo, row_hi + 1)
+        cols = np.arange(col_lo, col_hi + 1)
+        wanted = (rows[:, None] * self.n_cols + cols[None, :]).ravel()
+        slots = np.searchsorted(self.cell_keys, wanted)
+        found = slots < len(self.cell_keys)
+        found[found] = self.cell_keys[slots[found]] == wanted[found]
+        slots = slots[found]
+        if len(slots) == 0:
+            return np.empty(0, dtype=np.int64)
+        # 排回原始列順序，距離相同時的排序與全表掃描一致
+        return np.sort(np.concatenate([
+            self.order[self.cell_starts[s]:self.cell_starts[s + 1]] for s in slots
+        ]))
+
+    def query_radius(self, origin, radius_km, allowed=None, refine=True):
+        """半徑查詢
+
+        allowed 為長度等於索引筆數的布林遮罩（篩選條件），None 表示不限制。
+        回傳 (positions, distances)，positions 為原始資料的列位置，依距離排序。
+        """
+        cand = self.candidates(origin, radius_km)
+        if allowed is not None:
+            cand = cand[allowed[cand]]
+        positions, distances = find_within_radius(
+            origin, self.lats[cand], self.lngs[cand], radius_km, refine=refine)
+        return cand[positions], distances
+
+    def query_nearest(self, origin, k, allowed=None, max_km=None, refine=True):
+        """最近 k 間查詢（allowed 與回傳值同 query_radius），max_km 為最遠距離上限"""
+        reach = self.cell_deg * KM_PER_DEG_LAT
+        while True:
+            if max_km is not None and reach >= max_km:
+                reach = max_km
+            cand = self.candidates(origin, reach) if reach < HALF_EARTH_KM else self.valid
+            covers_all = len(cand) == len(self.valid)
+            if allowed is not None:
+                cand = cand[allowed[cand]]
+            positions, distances = find_nearest(
+                origin, self.lats[cand], self.lngs[cand], k, max_km=max_km, refine=refine)
+            # 半徑 reach 內的飯店一定都在候選中：第 k 近的距離不超過 reach 時結果即為全域最近
+            done = len(positions) >= k and (len(distances) == 0 or distances.max() <= reach)
+            if done or covers_all or reach == max_km:
+                return cand[positions], distances
+            reach *= 2.0
+
+
+class SortedDistances:
+    """單一查詢點的距離排序陣列（建立成本 O(M log M)，之後每次查詢 O(log M + 命中數)）"""
+
+    def __init__(self, origin, lats, lngs):
+        self.origin = (float(origin[0]), float(origin[1]))
+        self.lats = np.asarray(lats)
+        self.lngs = np.asarray(lngs)
+        distances = haversine_km(self.origin, self.lats, self.lngs)
+        # 座標無效（NaN）的飯店排在最後，不會落入任何半徑
+        order = np.argsort(distances, kind='stable')
+        # 每個地點各 session 保留一份：位置以 int32、距離以 float32 儲存，記憶體減半；
+        # float32 只用來二分搜尋範圍，回傳的距離一律重新以 float64 計算，與 GridIndex 完全相同
+        self.order = order[np.isfinite(distances[order])].astype(np.int32)
+        self.distances = distances[self.order].astype(np.float32)
+
+    def _exact(self, positions):
+        """飯店位置 → float64 haversine 距離（與 GridIndex 使用相同的計算）"""
+        return haversine_km(self.origin, self.lats[positions], self.lngs[positions])
+
+    def _prefix(self, limit_km, allowed):
+        """距離不超過 limit_km、且符合篩選遮罩的 (positions, distances)"""
+        # float32 的相對誤差約 6e-8：先以略寬的範圍二分搜尋，再以 float64 距離確認
+        end = np.searchsorted(self.distances, limit_km * (1.0 + FLOAT32_REL_MARGIN), side='right')
+        positions = self.order[:end].astype(np.int64)
+        if allowed is not None:
+            positions = positions[allowed[positions]]
+        distances = self._exact(positions)
+        keep = distances <= limit_km
+        return positions[keep], distances[keep]
+
+    def _refine(self, positions, distances, radius_km):
+        distances = refine_geodesic(self.origin, self.lats[positions], self.lngs[positions],
+                                    distances, radius_km)
+        keep = distances <= radius_km
+        return positions[keep], distances[keep]
+
+    @staticmethod
+    def _ordered(positions, distances):
+        # 與 find_within_radius 相同：依四捨五入後距離排序，距離相同時依原始列順序
+        order = np.lexsort((positions, np.round(distances, 2)))
+        return positions[order], distances[order]
+
+    def query_radius(self, radius_km, allowed=None, refine=True):
+        """半徑查詢，回傳值與 GridIndex.query_radius 相同"""
+        limit = radius_km * (1.0 + HAVERSINE_REL_TOLERANCE) if refine else radius_km
+        positions, distances = self._prefix(limit, allowed)
+        if refine and len(positions):
+            positions, distances = self._refine(positions, distances, radius_km)
+        return self._ordered(positions, distances)
+
+    def query_nearest(self, k, allowed=None, max_km=None, refine=True):
+        """最近 k 間查詢，回傳值與 GridIndex.query_nearest 相同"""
+        k = max(int(k), 0)
+        if max_km is not None:
+            positions, distances = self.query_radius(max_km, allowed, refine=refine)
+            if k < len(positions):
+                nearest = np.argpartition(distances, k - 1)[:k] if k else np.empty(0, dtype=np.int64)
+                positions, distances = positions[nearest], distances[nearest]
+            return self._ordered(positions, distances)
+
+        if allowed is None:
+            positions = self.order[:k].astype(np.int64)
+            return self._ordered(positions, self._exact(positions))
+        # 由近到遠逐步加倍檢查的範圍，找到 k 間符合篩選的飯店即停止
+        end = min(max(4 * k, 64), len(self.order))
+        while True:
+            hits = np.flatnonzero(allowed[self.order[:end]])
+            if len(hits) >= k or end == len(self.order):
+                break
+            end = min(end * 2, len(self.order))
+        hits = hits[:k]
+        positions = self.order[hits].astype(np.int64)
+        return self._ordered(positions, self._exact(positions))
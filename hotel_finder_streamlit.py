@@ -1,9 +1,25 @@
 import streamlit as st
 import pandas as pd
 from geopy.geocoders import Nominatim
-from geopy.distance import geodesic
 import os
-import io
+import numpy as np
+import pydeck as pdk
+
+from hotel_finder_clusters import MIN_ZOOM, ClusterPyramid, fit_view, label_features
+from hotel_finder_dataset import HotelDataset, artifact_path_for, dataset_version, validation_summary
+from hotel_finder_export import COORD_COLUMNS, EXPORT_FORMATS, available_formats, export_file
+from hotel_finder_filters import ROOM_SIZE_BY_LABEL, ROOM_SIZE_LABELS
+from hotel_finder_geocode import (
+    GeocodeCache, GeocodeScheduler, Geocoder, RateLimiter,
+    load_gazetteer, nominatim_resolver, rate_limited,
+)
+from hotel_finder_metrics import METRICS, start_metrics_server, stage_timer
+from hotel_finder_ranking import DEFAULT_WEIGHTS, RANKING_CRITERIA
+from hotel_finder_spatial import SortedDistances
+from hotel_finder_search import (
+    SearchResultCache, comparison_stats, read_place_list, search_location, search_locations,
+    search_nearest, search_nearest_many, search_ranked, search_ranked_many, search_text,
+)
 
 # 設定頁面配置
 st.set_page_config(
@@ -150,97 +166,276 @@ st.markdown("""
 # 使用相對路徑，適用於雲端部署
 CSV_FILE = "hotel_with_latlng.csv"
 
-@st.cache_data
-def download_hotel_data():
-    """載入飯店資料，使用 pandas 處理"""
+# 設定 HOTEL_FINDER_DEBUG=1 時在側邊欄顯示各階段耗時統計
+DEBUG_PANEL = os.environ.get("HOTEL_FINDER_DEBUG") == "1"
+
+# 多地點比較：文字輸入最多 5 個地點，更多地點改用上傳檔案的批次模式
+MAX_COMPARE_PLACES = 5
+MAX_BATCH_PLACES = 1000
+STATS_PAGE_SIZE = 50   # 比較統計表每頁地點數
+DETAIL_PAGE_SIZE = 20  # 詳細結果每頁地點數
+TEXT_SEARCH_LIMIT = 20  # 名稱 / 地址搜尋最多顯示筆數
+
+# 地圖大小（像素），用來計算可視範圍；只傳送範圍內的群集與單點
+MAP_WIDTH_PX = 1200
+MAP_HEIGHT_PX = 500
+
+def current_dataset_version():
+    """資料檔目前的版本（只讀取檔案大小與修改時間）；檔案不存在時回傳 None"""
     try:
-        if not os.path.exists(CSV_FILE):
+        return dataset_version(CSV_FILE)
+    except OSError:
+        return None
+
+@st.cache_resource(max_entries=1)
+def download_hotel_data(version):
+    """載入飯店資料並建立篩選遮罩與空間索引
+
+    以 st.cache_resource 快取，整個行程只有一份唯讀資料集，所有 session 共用，
+    不會像 st.cache_data 一樣為每次呼叫複製一份 DataFrame。
+    version 只作為快取鍵：資料檔更新（例如 hotel_finder_ingest.py 匯入新版登記資料）後
+    下一次重新執行就會載入新版資料集並取代舊版，不需重新啟動。
+    """
+    try:
+        if not os.path.exists(CSV_FILE) and not os.path.exists(artifact_path_for(CSV_FILE)):
             st.error(f"找不到飯店資料檔案！請確認 {CSV_FILE} 存在")
             return None
-        df = pd.read_csv(CSV_FILE, encoding="utf-8")
-        return df
+        with stage_timer("load", "streamlit"):
+            return HotelDataset.from_csv(CSV_FILE)
     except Exception as e:
         st.error(f"載入資料時發生錯誤：{str(e)}")
         return None
 
+def filter_options(selected_star, hot_spring_filter, room_filter):
+    """將側邊欄選項正規化為 (星級標章, 是否溫泉, 規模代碼)，也作為搜尋結果快取的鍵"""
+    star_name = None if selected_star == "🌟 全部星級" else selected_star.replace("⭐ ", "")
+    return star_name, bool(hot_spring_filter), ROOM_SIZE_BY_LABEL.get(room_filter)
+
+def compose_filters(selected_star, hot_spring_filter, room_filter):
+    """將側邊欄選項轉為篩選遮罩（只做遮罩 AND 運算，不複製資料）"""
+    star_name, hot_spring, room_size = filter_options(selected_star, hot_spring_filter, room_filter)
+    with stage_timer("filter", "streamlit"):
+        return filter_index.compose(star=star_name, hot_spring=hot_spring, room_size=room_size)
+
+@st.cache_resource
+def load_result_cache():
+    """所有 session 共用的搜尋結果快取"""
+    return SearchResultCache()
+
+def cached_search_records(loc, filter_key, radius, compute, *extra):
+    """提供 filter_key（filter_options 的結果）時，先查詢跨 session 的搜尋結果快取"""
+    if filter_key is None:
+        return compute().to_dict('records')
+    cache = load_result_cache()
+    key = cache.key(loc, filter_key, radius, *extra)
+    return cache.lookup(dataset.version, key, compute).to_dict('records')
+
+def search_indexed_hotels(loc, filter_mask, distance_range, include_coords=True, filter_key=None,
+                          sorted_distances=None):
+    """透過空間索引只查詢鄰近網格，再限制於符合篩選遮罩的飯店
+
+    sorted_distances 為同一地點的距離排序陣列（見 session_query），提供時只做二分搜尋與遮罩交集。
+    """
+    def compute():
+        with stage_timer("distance", "streamlit"):
+            return search_location(dataset, loc, filter_mask, distance_range,
+                                   include_coords=include_coords, sorted_distances=sorted_distances)
+
+    return cached_search_records(loc, filter_key, distance_range, compute, include_coords)
+
+def search_nearest_hotels(loc, filter_mask, nearest_count, max_distance=None,
+                          include_coords=True, filter_key=None, sorted_distances=None):
+    """最近 N 間搜尋（空間索引逐步擴大範圍 + 部分選取），max_distance 為最遠距離上限"""
+    def compute():
+        with stage_timer("distance", "streamlit"):
+            return search_nearest(dataset, loc, filter_mask, nearest_count, max_km=max_distance,
+                                  include_coords=include_coords, sorted_distances=sorted_distances)
+
+    return cached_search_records(loc, filter_key, max_distance or 0, compute,
+                                 include_coords, "nearest", nearest_count)
+
+def search_ranked_hotels(loc, filter_mask, distance_range, weights, k=None,
+                         include_coords=True, filter_key=None, sorted_distances=None):
+    """綜合評分搜尋：搜尋距離內的飯店依加權分數取前 k 名（一次向量化評分 + 部分選取）"""
+    def compute():
+        with stage_timer("rank", "streamlit"):
+            return search_ranked(dataset, loc, filter_mask, distance_range, weights, k,
+                                 include_coords=include_coords, sorted_distances=sorted_distances)
+
+    return cached_search_records(loc, filter_key, distance_range, compute,
+                                 include_coords, "ranked", k, tuple(sorted(weights.items())))
+
+@st.cache_resource
+def start_metrics_exporter():
+    """設定 HOTEL_FINDER_METRICS_PORT 時，另外啟動 Prometheus /metrics 伺服器（每個行程一次）"""
+    port = os.environ.get("HOTEL_FINDER_METRICS_PORT")
+    if port:
+        return start_metrics_server(int(port))
+    return None
+
+@st.cache_resource
+def load_geocoder():
+    """建立所有 session 共用的地理編碼器（離線地名表、持久化快取、Nominatim）"""
+    geolocator = Nominatim(user_agent="hotel_finder_streamlit")
+    # 加入台灣，提高搜尋準確度
+    resolver = nominatim_resolver(geolocator, suffix=", Taiwan")
+    # 所有 session 共用同一個節流器，總請求數不超過 Nominatim 的使用限制
+    resolver = rate_limited(resolver, RateLimiter())
+    return Geocoder(load_gazetteer(), GeocodeCache(), resolver)
+
+@st.cache_resource
+def load_geocode_scheduler():
+    """多地點比較使用的共用地理編碼排程器"""
+    return GeocodeScheduler(load_geocoder())
+
 def get_location_latlng(address):
-    """取得地點的經緯度"""
+    """取得地點的經緯度（縣市、鄉鎮、郵遞區號直接由離線地名表解析）"""
     try:
-        geolocator = Nominatim(user_agent="hotel_finder_streamlit")
-        location = geolocator.geocode(address + ", Taiwan")  # 加入台灣，提高搜尋準確度
-        if location:
-            return (location.latitude, location.longitude)
-        else:
-            return None
+        with stage_timer("geocode", "streamlit"):
+            return load_geocoder().geocode(address)
     except Exception as e:
         st.error(f"地理編碼時發生錯誤：{str(e)}")
         return None
 
-def filter_star_hotels(df):
-    """篩選星級飯店"""
-    # 只要「標章」欄有「星級」兩字就視為星級旅館
-    return df[df['標章'].astype(str).str.contains("星級", na=False)]
+def session_query(place):
+    """本 session 上一次查詢的地點、座標與距離排序陣列
 
-def search_hotels_for_location(location, filtered_df, distance_range):
-    """為單一地點搜尋飯店"""
-    loc = get_location_latlng(location)
+    第一次查詢某地點時只地理編碼，搜尋走空間索引（並先查詢搜尋結果快取）；
+    同一地點再次查詢（只調整搜尋距離或篩選條件）時才建立距離排序陣列，之後不重新地理編碼、
+    也不重新計算距離。地點不同或資料集更新時重新開始。查無地點時回傳 None。
+    """
+    query = st.session_state.get("last_query")
+    if query is not None and query["place"] == place and query["version"] == dataset.version:
+        if query["ranking"] is None:
+            with stage_timer("distance", "streamlit"):
+                query["ranking"] = SortedDistances(query["loc"], dataset.lats, dataset.lngs)
+        return query
+    loc = get_location_latlng(place)
     if loc is None:
-        return None, []
-    
-    hotels = []
-    for _, row in filtered_df.iterrows():
-        try:
-            hotel_loc = (float(row['lat']), float(row['lng']))
-            distance = geodesic(loc, hotel_loc).km
-            if distance <= distance_range:
-                hotels.append({
-                    "飯店名稱": row['旅宿名稱'],
-                    "星級標章": row['標章'],
-                    "地址": row['地址'],
-                    "電話": row.get('電話或手機', 'N/A'),
-                    "房間數": row.get('房間數', 'N/A'),
-                    "溫泉": "♨️" if row.get('溫泉標章', '') == '是' else "",
-                    "距離(公里)": round(distance, 2),
-                    "經度": float(row['lng']),
-                    "緯度": float(row['lat'])
-                })
-        except Exception:
-            continue
-    
-    # 按距離排序
-    hotels = sorted(hotels, key=lambda x: x['距離(公里)'])
-    return loc, hotels
+        st.session_state.pop("last_query", None)
+        return None
+    query = {"place": place, "loc": loc, "version": dataset.version, "ranking": None}
+    st.session_state["last_query"] = query
+    return query
 
-def generate_comparison_stats(location_results):
-    """生成多地點比較統計"""
-    stats = []
-    for location, (coords, hotels) in location_results.items():
-        if coords and hotels:
-            five_star_count = len([h for h in hotels if '五星' in h['星級標章']])
-            hot_spring_count = len([h for h in hotels if h['溫泉'] == '♨️'])
-            avg_distance = sum([h['距離(公里)'] for h in hotels]) / len(hotels) if hotels else 0
-            
-            stats.append({
-                "地點": location,
-                "飯店總數": len(hotels),
-                "五星飯店": five_star_count,
-                "溫泉飯店": hot_spring_count,
-                "平均距離": round(avg_distance, 1),
-                "最近距離": min([h['距離(公里)'] for h in hotels]) if hotels else 0,
-                "座標": coords
-            })
-        else:
-            stats.append({
-                "地點": location,
-                "飯店總數": 0,
-                "五星飯店": 0,
-                "溫泉飯店": 0,
-                "平均距離": 0,
-                "最近距離": 0,
-                "座標": None
-            })
-    
-    return pd.DataFrame(stats)
+def search_hotels_for_locations(location_coords, filter_mask, distance_range,
+                                nearest_count=None, max_distance=None, weights=None, filter_key=None):
+    """多地點批次搜尋：一次距離矩陣計算所有地點，回傳含「搜尋地點」欄位的長表
+
+    指定 nearest_count 時改為每個地點各取最近 N 間（max_distance 為最遠距離上限）；
+    指定 weights 時改為綜合評分，每個地點取搜尋距離內評分最高的 nearest_count 間（未指定則全部）。
+    提供 filter_key 時整份長表依地點組合與篩選條件跨 session 快取（回傳的資料表只能讀取）。
+    """
+    def compute():
+        if weights is not None:
+            with stage_timer("rank", "streamlit"):
+                return search_ranked_many(dataset, location_coords, filter_mask, distance_range,
+                                          weights, nearest_count)
+        with stage_timer("distance", "streamlit"):
+            if nearest_count:
+                return search_nearest_many(dataset, location_coords, filter_mask,
+                                           nearest_count, max_km=max_distance)
+            return search_locations(dataset, location_coords, filter_mask, distance_range)
+
+    if filter_key is None:
+        return compute()
+    cache = load_result_cache()
+    if weights is not None:
+        key = cache.key_many(location_coords, filter_key, distance_range,
+                             "ranked", nearest_count, tuple(sorted(weights.items())))
+    elif nearest_count:
+        key = cache.key_many(location_coords, filter_key, max_distance or 0, "nearest", nearest_count)
+    else:
+        key = cache.key_many(location_coords, filter_key, distance_range)
+    return cache.lookup(dataset.version, key, compute)
+
+def generate_comparison_stats(location_coords, comparison_hits):
+    """生成多地點比較統計（對長表結果做一次 groupby）"""
+    with stage_timer("stats", "streamlit"):
+        return comparison_stats(location_coords, comparison_hits)
+
+def render_download(frame, file_stem, label, key, table_only_drop=()):
+    """匯出格式選擇 + 下載按鈕（逐塊寫入暫存檔，不在記憶體中組出整份字串）
+
+    table_only_drop 為只在 GeoJSON 使用、CSV / Parquet 不輸出的欄位（例如座標）。
+    """
+    export_format = st.radio("匯出格式", available_formats(), horizontal=True, key=key)
+    if export_format != "GeoJSON":
+        frame = frame.drop(columns=list(table_only_drop))
+    extension, mime = EXPORT_FORMATS[export_format]
+    with stage_timer("export", "streamlit"):
+        data = export_file(frame, export_format)
+    with data:
+        st.download_button(
+            label=f"{label} ({export_format})",
+            data=data,
+            file_name=file_stem + extension,
+            mime=mime,
+            use_container_width=True,
+            type="secondary"
+        )
+
+def paginate(total, page_size, key):
+    """超過一頁時顯示頁次選擇，回傳本頁的 slice（只有一頁時不顯示）"""
+    pages = -(-total // page_size)
+    if pages <= 1:
+        return slice(0, total)
+    page = st.number_input(f"頁次（共 {pages} 頁）", min_value=1, max_value=pages,
+                           value=1, step=1, key=key)
+    start = (int(page) - 1) * page_size
+    st.caption(f"第 {start + 1}–{min(start + page_size, total)} 個地點，共 {total} 個")
+    return slice(start, start + page_size)
+
+def render_cluster_map(markers, hotels, key):
+    """搜尋結果的飯店分布地圖：只對本次結果的飯店建立各層級群集
+
+    markers 為 [(名稱, 座標)]，hotels 為含經緯度欄位的搜尋結果；地圖依結果與地點的範圍置中並選擇縮放層級，
+    結果改變時縮放滑桿回到自動選擇的層級。群集涵蓋所有結果，不受畫面範圍限制。
+    """
+    lats = np.concatenate([hotels['緯度'].to_numpy(dtype=float), [loc[0] for _, loc in markers]])
+    lngs = np.concatenate([hotels['經度'].to_numpy(dtype=float), [loc[1] for _, loc in markers]])
+    center, fitted = fit_view(lats, lngs, MAP_WIDTH_PX, MAP_HEIGHT_PX)
+    fitted = max(fitted, MIN_ZOOM)
+    view = (center, fitted, len(hotels))
+    if st.session_state.get(f"{key}_view") != view:
+        st.session_state[f"{key}_view"] = view
+        st.session_state[key] = fitted
+    zoom = st.slider("🔎 地圖縮放層級", min_value=MIN_ZOOM, max_value=18, key=key)
+    with stage_timer("map", "streamlit"):
+        pyramid = ClusterPyramid(hotels['緯度'].to_numpy(dtype=float), hotels['經度'].to_numpy(dtype=float))
+        bounds = (np.nanmin(lats), np.nanmin(lngs), np.nanmax(lats), np.nanmax(lngs))
+        features, level = pyramid.query(zoom, bounds)
+        features = label_features(features, hotels.rename(columns={'飯店名稱': '旅宿名稱', '星級標章': '標章'}))
+    clusters = features[features['position'] < 0].assign(
+        radius=lambda f: 10 + 4 * np.log2(f['count']),
+        count_text=lambda f: f['count'].astype(str),
+    )
+    points = features[features['position'] >= 0]
+    places = pd.DataFrame({
+        "lat": [loc[0] for _, loc in markers],
+        "lng": [loc[1] for _, loc in markers],
+        "label": [f"📍 {name}" for name, _ in markers],
+    })
+    layers = [
+        pdk.Layer("ScatterplotLayer", clusters, get_position=["lng", "lat"], get_radius="radius",
+                  radius_units="pixels", get_fill_color=[46, 134, 171, 180], pickable=True),
+        pdk.Layer("TextLayer", clusters, get_position=["lng", "lat"], get_text="count_text",
+                  get_size=14, get_color=[255, 255, 255], pickable=False),
+        pdk.Layer("ScatterplotLayer", points, get_position=["lng", "lat"], get_radius=7,
+                  radius_units="pixels", get_fill_color=[255, 107, 107, 220], pickable=True),
+        pdk.Layer("ScatterplotLayer", places, get_position=["lng", "lat"], get_radius=9,
+                  radius_units="pixels", get_fill_color=[231, 76, 60, 255],
+                  get_line_color=[255, 255, 255], line_width_min_pixels=2, stroked=True, pickable=True),
+    ]
+    st.pydeck_chart(pdk.Deck(
+        layers=layers,
+        initial_view_state=pdk.ViewState(latitude=center[0], longitude=center[1], zoom=zoom),
+        tooltip={"text": "{label}"},
+        height=MAP_HEIGHT_PX,
+    ), use_container_width=True)
+    st.caption(f"🗺️ 本次搜尋結果 {int(features['count'].sum())} 間飯店：{len(clusters)} 個群集、"
+               f"{len(points)} 間單獨顯示（群集層級 {level}）；群集依滑桿的縮放層級計算，"
+               f"拖曳或以滑鼠縮放地圖不會重新計算群集")
 
 def create_result_table(hotels_df):
     """創建美化的結果表格 HTML"""
@@ -329,12 +524,15 @@ st.markdown("<br>", unsafe_allow_html=True)
 st.markdown('<div class="search-container">', unsafe_allow_html=True)
 st.markdown("### 🔍 開始您的飯店搜尋之旅")
 
-# 載入資料（使用快取）
-@st.cache_data
-def load_hotel_data_for_filters():
-    return download_hotel_data()
-
-df = load_hotel_data_for_filters()
+# 載入資料（所有 session 共用同一份唯讀資料集，請勿修改 df）
+start_metrics_exporter()
+dataset = download_hotel_data(current_dataset_version())
+if dataset is not None:
+    df = dataset.frame
+    spatial_index = dataset.spatial
+    filter_index = dataset.filters
+else:
+    df = spatial_index = filter_index = None
 
 # 在側邊欄顯示篩選選項
 with st.sidebar:
@@ -343,9 +541,8 @@ with st.sidebar:
     # 1. 星級篩選器
     st.markdown("#### ⭐ 星級篩選")
     if df is not None:
-        # 獲取所有星級選項
-        star_options = df['標章'].unique().tolist()
-        star_options.sort()
+        # 獲取所有星級選項（全國旅宿資料多數沒有標章，先去除缺值再排序）
+        star_options = sorted(df['標章'].dropna().astype(str).unique().tolist())
         
         # 添加 "全部" 選項
         star_filter_options = ["🌟 全部星級"] + [f"⭐ {star}" for star in star_options if "星" in str(star)]
@@ -369,19 +566,58 @@ with st.sidebar:
         help="調整搜尋範圍，預設為 10 公里"
     )
     
+    # 搜尋方式：範圍內全部，或不限範圍找最近的 N 間（鄉間地區也能找到飯店）
+    search_method = st.radio(
+        "搜尋方式",
+        options=["📏 範圍內所有飯店", "🎯 最近 N 間飯店"],
+        help="最近 N 間模式由近到遠列出指定數量的飯店，不受搜尋距離限制"
+    )
+    if search_method == "🎯 最近 N 間飯店":
+        nearest_count = int(st.number_input("飯店數量 (N)", min_value=1, max_value=50, value=10, step=1))
+        use_distance_cap = st.checkbox("以搜尋距離作為最遠距離上限", value=False)
+        max_distance = distance_range if use_distance_cap else None
+    else:
+        nearest_count = None
+        max_distance = None
+    
+    # 結果說明文字
+    if nearest_count:
+        range_text = f"最近的 {nearest_count} 間" + (f"（{max_distance}km 內）" if max_distance else "")
+        empty_range_text = f"{max_distance}公里內" if max_distance else "附近"
+    else:
+        range_text = f"附近 {distance_range}km 內的"
+        empty_range_text = f"{distance_range}公里內"
+    
+    # 排序方式：依距離，或距離、星級、溫泉、房間數加權的綜合評分
+    st.markdown("#### ⚖️ 排序方式")
+    sort_method = st.radio(
+        "結果排序",
+        options=["📏 依距離", "⚖️ 綜合評分"],
+        horizontal=True,
+        help="綜合評分依權重為搜尋距離內的每間飯店計算 0 ~ 100 分，由高到低排列"
+    )
+    if sort_method == "⚖️ 綜合評分":
+        ranking_weights = {
+            name: float(st.slider(label, min_value=0, max_value=5,
+                                  value=int(DEFAULT_WEIGHTS[name]), key=f"weight_{name}"))
+            for name, label in RANKING_CRITERIA.items()
+        }
+        st.caption("只評比搜尋距離內的飯店；選擇「最近 N 間」時取評分最高的 N 間")
+        if nearest_count:
+            range_text = f"附近 {distance_range}km 內評分最高的 {nearest_count} 間"
+        else:
+            range_text = f"附近 {distance_range}km 內的"
+        empty_range_text = f"{distance_range}公里內"
+    else:
+        ranking_weights = None
+    
     # 3. 飯店規模篩選（基於房間數）
     st.markdown("#### 🏨 飯店規模")
     if df is not None:
         # 基於房間數分類飯店規模
         room_filter = st.selectbox(
             "選擇飯店規模",
-            options=[
-                "🏨 全部規模",
-                "🏠 精品小型 (50間以下)",
-                "🏢 中型規模 (50-150間)",
-                "🏨 大型飯店 (150-300間)",
-                "🏰 超大型 (300間以上)"
-            ],
+            options=["🏨 全部規模"] + list(ROOM_SIZE_LABELS.values()),
             help="根據房間數量篩選飯店規模"
         )
     else:
@@ -400,77 +636,47 @@ with st.sidebar:
     st.markdown("### 📋 系統資訊")
     if df is not None:
         st.success(f"✅ 已載入 {len(df)} 筆飯店資料")
+        if len(dataset.quarantine):
+            st.caption(f"⚠️ {validation_summary(dataset.validation)}")
         
-        # 即時篩選預覽
-        try:
-            preview_df = df.copy()
-            
-            # 應用基本星級篩選
-            preview_df = filter_star_hotels(preview_df)
-            basic_count = len(preview_df)
-            
-            # 應用星級篩選器
-            if selected_star != "🌟 全部星級":
-                star_name = selected_star.replace("⭐ ", "")
-                preview_df = preview_df[preview_df['標章'] == star_name]
-            
-            # 應用溫泉篩選
-            if hot_spring_filter:
-                preview_df = preview_df[preview_df['溫泉標章'] == '是']
-            
-            # 應用房間數篩選
-            if room_filter != "🏨 全部規模":
-                try:
-                    preview_df['房間數_清理'] = pd.to_numeric(preview_df['房間數'], errors='coerce')
-                    if room_filter == "🏠 精品小型 (50間以下)":
-                        preview_df = preview_df[
-                            (preview_df['房間數_清理'].notna()) & 
-                            (preview_df['房間數_清理'] < 50)
-                        ]
-                    elif room_filter == "🏢 中型規模 (50-150間)":
-                        preview_df = preview_df[
-                            (preview_df['房間數_清理'].notna()) & 
-                            (preview_df['房間數_清理'] >= 50) & 
-                            (preview_df['房間數_清理'] <= 150)
-                        ]
-                    elif room_filter == "🏨 大型飯店 (150-300間)":
-                        preview_df = preview_df[
-                            (preview_df['房間數_清理'].notna()) & 
-                            (preview_df['房間數_清理'] > 150) & 
-                            (preview_df['房間數_清理'] <= 300)
-                        ]
-                    elif room_filter == "🏰 超大型 (300間以上)":
-                        preview_df = preview_df[
-                            (preview_df['房間數_清理'].notna()) & 
-                            (preview_df['房間數_清理'] > 300)
-                        ]
-                except:
-                    pass  # 如果房間數篩選出錯，跳過
-            
-            final_count = len(preview_df)
-            
-            # 顯示篩選結果統計
-            st.info(f"🏨 符合條件飯店：{final_count} 間")
-            if final_count != basic_count:
-                st.caption(f"從 {basic_count} 間篩選得出")
-            
-            # 溫泉飯店統計
-            hot_spring_total = len(df[df['溫泉標章'] == '是'])
-            st.info(f"♨️ 全台溫泉飯店：{hot_spring_total} 間")
-            
-        except Exception as e:
-            st.warning("篩選預覽計算中...")
+        # 即時篩選預覽（查詢預先建立的筆數立方體，不掃描資料）
+        star_name, hot_spring, room_size = filter_options(selected_star, hot_spring_filter, room_filter)
+        basic_count = dataset.counts.count()
+        final_count = dataset.counts.count(star=star_name, hot_spring=hot_spring, room_size=room_size)
+        
+        # 顯示篩選結果統計
+        st.info(f"🏨 符合條件飯店：{final_count} 間")
+        if final_count != basic_count:
+            st.caption(f"從 {basic_count} 間篩選得出")
+        
+        # 溫泉飯店統計
+        hot_spring_total = dataset.counts.count(hot_spring=True, star_only=False)
+        st.info(f"♨️ 全台溫泉飯店：{hot_spring_total} 間")
         
         st.info(f"🌟 涵蓋全台星級飯店")
+        
+        # 地理編碼快取統計
+        geocode_stats = load_geocoder().stats()
+        st.caption(
+            f"🗺️ 地理編碼：離線地名 {geocode_stats['offline_hits']} 次 | "
+            f"快取命中 {geocode_stats['hits']} 次 / "
+            f"未命中 {geocode_stats['misses']} 次（共 {geocode_stats['entries']} 筆）"
+        )
+        result_stats = load_result_cache().stats()
+        st.caption(
+            f"🔁 搜尋結果快取：命中 {result_stats['hits']} 次 / "
+            f"未命中 {result_stats['misses']} 次（命中率 {result_stats['hit_rate']:.0%}，"
+            f"共 {result_stats['entries']} 筆）"
+        )
     else:
         st.error("❌ 資料載入失敗")
 
 # 搜尋模式選擇
 search_mode = st.radio(
     "🔍 搜尋模式",
-    options=["📍 單地點搜尋", "🗺️ 多地點比較"],
+    options=["📍 單地點搜尋", "🗺️ 多地點比較", "🔎 飯店名稱 / 地址"],
     horizontal=True,
-    help="選擇單一地點搜尋或多地點比較模式"
+    help="選擇單一地點搜尋、多地點比較，或直接以飯店名稱、地址查詢飯店"
 )
 
 if search_mode == "📍 單地點搜尋":
@@ -492,7 +698,7 @@ if search_mode == "📍 單地點搜尋":
     multi_places = None
     compare_button = False
 
-else:  # 多地點比較模式
+elif search_mode == "🗺️ 多地點比較":
     st.markdown("### 🗺️ 多地點比較搜尋")
     
     # 多地點輸入區域
@@ -503,27 +709,48 @@ else:  # 多地點比較模式
             "🗺️ 請輸入多個地點進行比較", 
             placeholder="請輸入多個地點，每行一個地點，例如：\n台北車站\n台中火車站\n高雄火車站",
             height=100,
-            help="💡 每行輸入一個地點，最多支援5個地點同時比較"
+            help=f"💡 每行輸入一個地點，最多支援{MAX_COMPARE_PLACES}個地點同時比較；更多地點請上傳檔案"
+        )
+        
+        # 批次模式：上傳地點清單檔案（每行一個地點，或含「地點」欄位的 CSV）
+        places_file = st.file_uploader(
+            "📂 批次模式：上傳地點清單 (CSV / TXT)",
+            type=["csv", "txt"],
+            help=f"💡 上傳檔案時忽略上方輸入，最多 {MAX_BATCH_PLACES} 個地點"
         )
         
         # 處理多地點輸入
-        if multi_places_input.strip():
+        batch_mode = places_file is not None
+        if batch_mode:
+            try:
+                multi_places = read_place_list(places_file.getvalue(), places_file.name)
+            except ValueError as e:
+                st.error(f"❌ {e}")
+                multi_places = []
+            if len(multi_places) > MAX_BATCH_PLACES:
+                st.warning(f"⚠️ 批次模式最多支援{MAX_BATCH_PLACES}個地點，已自動截取前{MAX_BATCH_PLACES}個")
+                multi_places = multi_places[:MAX_BATCH_PLACES]
+        elif multi_places_input.strip():
             multi_places = [place.strip() for place in multi_places_input.strip().split('\n') if place.strip()]
-            if len(multi_places) > 5:
-                st.warning("⚠️ 最多支援5個地點比較，已自動截取前5個")
-                multi_places = multi_places[:5]
-            elif len(multi_places) < 2:
-                st.info("💡 請輸入至少2個地點進行比較")
-                multi_places = None
+            if len(multi_places) > MAX_COMPARE_PLACES:
+                st.warning(f"⚠️ 最多支援{MAX_COMPARE_PLACES}個地點比較，已自動截取前{MAX_COMPARE_PLACES}個；"
+                           "更多地點請使用批次模式上傳檔案")
+                multi_places = multi_places[:MAX_COMPARE_PLACES]
         else:
             multi_places = None
+        if multi_places is not None and len(multi_places) < 2:
+            st.info("💡 請輸入至少2個地點進行比較")
+            multi_places = None
     
     with col2:
         st.markdown("<br>", unsafe_allow_html=True)
         compare_button = st.button("🔍 開始比較", type="primary", use_container_width=True)
     
     # 顯示將要比較的地點
-    if multi_places:
+    if multi_places and batch_mode:
+        preview = "、".join(multi_places[:10]) + ("…" if len(multi_places) > 10 else "")
+        st.markdown(f"**📍 將要比較 {len(multi_places)} 個地點：** {preview}")
+    elif multi_places:
         st.markdown("**📍 將要比較的地點：**")
         for i, loc in enumerate(multi_places, 1):
             st.markdown(f"  {i}. {loc}")
@@ -532,16 +759,58 @@ else:  # 多地點比較模式
     place = None
     search_button = False
 
+else:  # 飯店名稱 / 地址搜尋模式
+    st.markdown("### 🔎 以飯店名稱或地址查詢")
+    text_query = st.text_input(
+        "🏨 輸入飯店名稱或地址的任一部分",
+        placeholder="例如：君悅、福華 台中、中山北路",
+        help="💡 以空白分隔多個關鍵字時，每個關鍵字都必須出現；結果套用側邊欄的星級、規模與溫泉篩選"
+    )
+    
+    if text_query.strip() and df is not None:
+        # n-gram 索引查詢（載入時已建立），與側邊欄篩選遮罩取交集
+        filter_mask = compose_filters(selected_star, hot_spring_filter, room_filter)
+        with stage_timer("text", "streamlit"):
+            text_hits = search_text(dataset, text_query, filter_mask, limit=TEXT_SEARCH_LIMIT,
+                                    include_coords=False)
+        if len(text_hits):
+            st.caption(f"相符程度最高的 {len(text_hits)} 間飯店（名稱相符優先於地址相符）")
+            st.dataframe(
+                text_hits,
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "飯店名稱": st.column_config.TextColumn("🏨 飯店名稱", width="large"),
+                    "星級標章": st.column_config.TextColumn("⭐ 星級"),
+                    "地址": st.column_config.TextColumn("📍 地址", width="large"),
+                    "電話": st.column_config.TextColumn("📞 電話"),
+                    "房間數": st.column_config.NumberColumn("🏢 房間數"),
+                    "溫泉": st.column_config.TextColumn("♨️ 溫泉"),
+                }
+            )
+            st.caption("💡 想查詢某間飯店附近的其他飯店時，可將地址貼到「單地點搜尋」")
+        else:
+            st.warning("😔 沒有名稱或地址相符、且符合篩選條件的飯店")
+    
+    # 其他模式的變數設為 None
+    place = None
+    search_button = False
+    multi_places = None
+    compare_button = False
+
 st.markdown('</div>', unsafe_allow_html=True)
 
-# 查詢處理
-if search_button and place:
+# 查詢處理：按下搜尋，或已查詢過同一地點後調整側邊欄（結果即時更新，不重新地理編碼）
+last_query = st.session_state.get("last_query")
+repeat_query = last_query is not None and last_query["place"] == place
+if place and (search_button or repeat_query):
     if df is None:
         st.error("❌ 無法載入飯店資料，請稍後再試")
         st.stop()
     
-    with st.spinner(f"🔍 正在搜尋 {place} 附近 {distance_range} 公里內的星級飯店..."):
-        loc = get_location_latlng(place)
+    with st.spinner(f"🔍 正在搜尋 {place} {range_text}星級飯店..."):
+        query = session_query(place)
+        loc = query["loc"] if query is not None else None
         
     if loc is None:
         st.error("❌ 查無此地點，請確認地名是否正確或嘗試更具體的地址")
@@ -549,76 +818,23 @@ if search_button and place:
     else:
         st.success(f"✅ 找到 {place} 的位置：緯度 {loc[0]:.6f}, 經度 {loc[1]:.6f}")
         
-        # 應用篩選條件
-        filtered_df = df.copy()
-        
-        # 1. 篩選星級飯店（基本篩選）
-        filtered_df = filter_star_hotels(filtered_df)
-        
-        # 2. 應用星級篩選器
-        if selected_star != "🌟 全部星級":
-            star_name = selected_star.replace("⭐ ", "")
-            filtered_df = filtered_df[filtered_df['標章'] == star_name]
-        
-        # 3. 應用溫泉篩選
-        if hot_spring_filter:
-            filtered_df = filtered_df[filtered_df['溫泉標章'] == '是']
-        
-        # 4. 應用房間數篩選（飯店規模）
-        if room_filter != "🏨 全部規模":
-            try:
-                # 清理房間數資料，轉換為數字型態
-                filtered_df = filtered_df.copy()
-                filtered_df['房間數_清理'] = pd.to_numeric(filtered_df['房間數'], errors='coerce')
-                
-                if room_filter == "🏠 精品小型 (50間以下)":
-                    filtered_df = filtered_df[
-                        (filtered_df['房間數_清理'].notna()) & 
-                        (filtered_df['房間數_清理'] < 50)
-                    ]
-                elif room_filter == "🏢 中型規模 (50-150間)":
-                    filtered_df = filtered_df[
-                        (filtered_df['房間數_清理'].notna()) & 
-                        (filtered_df['房間數_清理'] >= 50) & 
-                        (filtered_df['房間數_清理'] <= 150)
-                    ]
-                elif room_filter == "🏨 大型飯店 (150-300間)":
-                    filtered_df = filtered_df[
-                        (filtered_df['房間數_清理'].notna()) & 
-                        (filtered_df['房間數_清理'] > 150) & 
-                        (filtered_df['房間數_清理'] <= 300)
-                    ]
-                elif room_filter == "🏰 超大型 (300間以上)":
-                    filtered_df = filtered_df[
-                        (filtered_df['房間數_清理'].notna()) & 
-                        (filtered_df['房間數_清理'] > 300)
-                    ]
-            except Exception as e:
-                st.warning(f"房間數篩選時發生問題，已跳過此篩選條件")
-                # 如果出錯，就不應用房間數篩選
-        
-        # 5. 搜尋指定範圍內的飯店
-        hotels = []
-        
-        for _, row in filtered_df.iterrows():
-            try:
-                hotel_loc = (float(row['lat']), float(row['lng']))
-                distance = geodesic(loc, hotel_loc).km
-                if distance <= distance_range:  # 使用用戶設定的距離範圍
-                    hotels.append({
-                        "飯店名稱": row['旅宿名稱'],
-                        "星級標章": row['標章'],
-                        "地址": row['地址'],
-                        "電話": row.get('電話或手機', 'N/A'),
-                        "房間數": row.get('房間數', 'N/A'),
-                        "溫泉": "♨️" if row.get('溫泉標章', '') == '是' else "",
-                        "距離(公里)": round(distance, 2)
-                    })
-            except Exception:
-                continue
+        # 應用篩選條件（組合預先建立的遮罩，不複製資料）
+        filter_mask = compose_filters(selected_star, hot_spring_filter, room_filter)
+        filter_key = filter_options(selected_star, hot_spring_filter, room_filter)
         
-        # 按距離排序
-        hotels = sorted(hotels, key=lambda x: x['距離(公里)'])
+        # 搜尋指定範圍內的飯店（熱門查詢直接取自快取；同一地點再次查詢時改用距離排序陣列 + 二分搜尋）
+        if ranking_weights is not None:
+            hotels = search_ranked_hotels(loc, filter_mask, distance_range, ranking_weights,
+                                          nearest_count, filter_key=filter_key,
+                                          sorted_distances=query["ranking"])
+        elif nearest_count:
+            hotels = search_nearest_hotels(loc, filter_mask, nearest_count, max_distance,
+                                           filter_key=filter_key,
+                                           sorted_distances=query["ranking"])
+        else:
+            hotels = search_indexed_hotels(loc, filter_mask, distance_range,
+                                           filter_key=filter_key,
+                                           sorted_distances=query["ranking"])
         
         if hotels:
             # 美化的結果標題
@@ -636,7 +852,7 @@ if search_button and place:
             st.markdown(f"""
             <div class="result-card">
                 <h2 style="color: #2E86AB; text-align: center; margin-bottom: 1rem;">
-                    🎉 搜尋結果：{place} 附近 {distance_range}km 內的星級飯店
+                    🎉 搜尋結果：{place} {range_text}星級飯店
                 </h2>
                 <p style="text-align: center; color: #666; font-size: 1.1rem;">
                     篩選條件：{condition_text}
@@ -687,85 +903,85 @@ if search_button and place:
             
             st.markdown("<br><br>", unsafe_allow_html=True)
             
-            # 顯示結果表格 - 使用 pandas dataframe
-            df_result = pd.DataFrame(hotels)
+            # 顯示結果表格 - 使用 pandas dataframe（座標只用於 GeoJSON 匯出，不顯示）
+            df_hotels = pd.DataFrame(hotels)
+            df_result = df_hotels.drop(columns=COORD_COLUMNS)
             
             # 美化的表格顯示
             st.markdown("### 📊 詳細搜尋結果")
-            st.dataframe(
-                df_result, 
-                use_container_width=True, 
-                height=400,
-                column_config={
-                    "飯店名稱": st.column_config.TextColumn(
-                        "🏨 飯店名稱",
-                        help="星級飯店名稱",
-                        width="large"
-                    ),
-                    "星級標章": st.column_config.TextColumn(
-                        "⭐ 星級標章",
-                        help="政府認證星級標章"
-                    ),
-                    "地址": st.column_config.TextColumn(
-                        "📍 地址",
-                        help="飯店完整地址",
-                        width="large"
-                    ),
-                    "電話": st.column_config.TextColumn(
-                        "📞 聯絡電話",
-                        help="飯店聯絡電話"
-                    ),
-                    "房間數": st.column_config.NumberColumn(
-                        "🏢 房間數",
-                        help="飯店總房間數",
-                        format="%d",
-                        width="small"
-                    ),
-                    "溫泉": st.column_config.TextColumn(
-                        "♨️ 溫泉",
-                        help="是否有溫泉設施",
-                        width="small"
-                    ),
-                    "距離(公里)": st.column_config.NumberColumn(
-                        "📏 距離(公里)",
-                        help="距離查詢地點的直線距離",
-                        format="%.2f",
-                        width="small"
-                    )
-                }
-            )
-            
-            # 修復 CSV 編碼問題的下載功能
-            def create_csv_download_pandas(df_data, location_name):
-                # 使用 pandas to_csv 並確保編碼正確
-                csv_string = df_data.to_csv(index=False, encoding='utf-8')
-                # 添加 BOM 標記
-                csv_with_bom = '\ufeff' + csv_string
-                return csv_with_bom
+            with stage_timer("render", "streamlit"):
+                st.dataframe(
+                    df_result, 
+                    use_container_width=True, 
+                    height=400,
+                    column_config={
+                        "飯店名稱": st.column_config.TextColumn(
+                            "🏨 飯店名稱",
+                            help="星級飯店名稱",
+                            width="large"
+                        ),
+                        "星級標章": st.column_config.TextColumn(
+                            "⭐ 星級標章",
+                            help="政府認證星級標章"
+                        ),
+                        "地址": st.column_config.TextColumn(
+                            "📍 地址",
+                            help="飯店完整地址",
+                            width="large"
+                        ),
+                        "電話": st.column_config.TextColumn(
+                            "📞 聯絡電話",
+                            help="飯店聯絡電話"
+                        ),
+                        "房間數": st.column_config.NumberColumn(
+                            "🏢 房間數",
+                            help="飯店總房間數",
+                            format="%d",
+                            width="small"
+                        ),
+                        "溫泉": st.column_config.TextColumn(
+                            "♨️ 溫泉",
+                            help="是否有溫泉設施",
+                            width="small"
+                        ),
+                        "距離(公里)": st.column_config.NumberColumn(
+                            "📏 距離(公里)",
+                            help="距離查詢地點的直線距離",
+                            format="%.2f",
+                            width="small"
+                        ),
+                        "評分": st.column_config.NumberColumn(
+                            "⚖️ 評分",
+                            help="依側邊欄權重計算的綜合評分（0 ~ 100）",
+                            format="%.1f",
+                            width="small"
+                        )
+                    }
+                )
             
-            # 生成 CSV 內容
-            csv_data = create_csv_download_pandas(df_result, place)
+            # 飯店分布地圖（搜尋結果的群集，依結果範圍自動置中與縮放）
+            st.markdown("### 🗺️ 飯店分布地圖")
+            render_cluster_map([(place, loc)], df_hotels, "single_map_zoom")
             
             # 美化的下載按鈕區域
             st.markdown("<br>", unsafe_allow_html=True)
             col1, col2, col3 = st.columns([1, 2, 1])
             with col2:
-                st.download_button(
-                    label="📥 下載查詢結果 (CSV)",
-                    data=csv_data.encode('utf-8'),
-                    file_name=f"{place}_星級飯店查詢結果_{len(hotels)}間.csv",
-                    mime="text/csv; charset=utf-8",
-                    use_container_width=True,
-                    type="secondary"
-                )
+                render_download(df_hotels, f"{place}_星級飯店查詢結果_{len(hotels)}間",
+                                "📥 下載查詢結果", "single_export_format",
+                                table_only_drop=COORD_COLUMNS)
             
             # 額外資訊提示
-            st.markdown("""
+            if ranking_weights is not None:
+                sort_tip = "結果已按綜合評分排序，評分最高的飯店在最上方"
+            else:
+                sort_tip = "結果已按距離遠近排序，最近的飯店在最上方"
+            st.markdown(f"""
             <div style="background: #f8f9fa; padding: 1rem; border-radius: 10px; margin-top: 1rem;">
                 <h4 style="color: #495057; margin-bottom: 0.5rem;">💡 使用小貼士</h4>
                 <ul style="color: #6c757d; margin-bottom: 0;">
-                    <li>點擊上方按鈕可下載完整搜尋結果 CSV 檔案</li>
-                    <li>結果已按距離遠近排序，最近的飯店在最上方</li>
+                    <li>點擊上方按鈕可下載完整搜尋結果（CSV、Parquet 或 GeoJSON）</li>
+                    <li>{sort_tip}</li>
                     <li>表格支援排序和篩選功能</li>
                     <li>CSV 檔案採用 UTF-8 編碼，確保中文正常顯示</li>
                 </ul>
@@ -777,7 +993,7 @@ if search_button and place:
             st.markdown(f"""
             <div class="result-card" style="text-align: center; padding: 3rem;">
                 <h2 style="color: #e74c3c;">😔 很抱歉</h2>
-                <p style="font-size: 1.2rem; color: #7f8c8d;">在 <strong>{place}</strong> {distance_range}公里內找不到符合條件的星級飯店</p>
+                <p style="font-size: 1.2rem; color: #7f8c8d;">在 <strong>{place}</strong> {empty_range_text}找不到符合條件的星級飯店</p>
                 <div style="background: #fff3cd; padding: 1rem; border-radius: 10px; margin-top: 1rem;">
                     <h4 style="color: #856404;">💡 建議嘗試</h4>
                     <ul style="color: #856404; text-align: left;">
@@ -791,75 +1007,52 @@ if search_button and place:
             </div>
             """, unsafe_allow_html=True)
 
-# 多地點比較處理
-elif compare_button and multi_places:
+# 多地點比較處理：按下比較，或已比較過同一組地點後調整側邊欄 / 換頁（地理編碼結果來自快取）
+elif multi_places and (compare_button or st.session_state.get("last_comparison") == multi_places):
     if df is None:
         st.error("❌ 無法載入飯店資料，請稍後再試")
         st.stop()
+    st.session_state["last_comparison"] = multi_places
     
     st.markdown("## 🗺️ 多地點比較結果")
     
     with st.spinner(f"🔍 正在搜尋 {len(multi_places)} 個地點的星級飯店..."):
-        # 應用篩選條件
-        filtered_df = df.copy()
+        # 應用篩選條件（組合預先建立的遮罩，不複製資料）
+        filter_mask = compose_filters(selected_star, hot_spring_filter, room_filter)
+        filter_key = filter_options(selected_star, hot_spring_filter, room_filter)
         
-        # 1. 篩選星級飯店（基本篩選）
-        filtered_df = filter_star_hotels(filtered_df)
-        
-        # 2. 應用星級篩選器
-        if selected_star != "🌟 全部星級":
-            star_name = selected_star.replace("⭐ ", "")
-            filtered_df = filtered_df[filtered_df['標章'] == star_name]
-        
-        # 3. 應用溫泉篩選
-        if hot_spring_filter:
-            filtered_df = filtered_df[filtered_df['溫泉標章'] == '是']
-        
-        # 4. 應用房間數篩選（飯店規模）
-        if room_filter != "🏨 全部規模":
-            try:
-                # 清理房間數資料，轉換為數字型態
-                filtered_df = filtered_df.copy()
-                filtered_df['房間數_清理'] = pd.to_numeric(filtered_df['房間數'], errors='coerce')
-                
-                if room_filter == "🏠 精品小型 (50間以下)":
-                    filtered_df = filtered_df[
-                        (filtered_df['房間數_清理'].notna()) & 
-                        (filtered_df['房間數_清理'] < 50)
-                    ]
-                elif room_filter == "🏢 中型規模 (50-150間)":
-                    filtered_df = filtered_df[
-                        (filtered_df['房間數_清理'].notna()) & 
-                        (filtered_df['房間數_清理'] >= 50) & 
-                        (filtered_df['房間數_清理'] <= 150)
-                    ]
-                elif room_filter == "🏨 大型飯店 (150-300間)":
-                    filtered_df = filtered_df[
-                        (filtered_df['房間數_清理'].notna()) & 
-                        (filtered_df['房間數_清理'] > 150) & 
-                        (filtered_df['房間數_清理'] <= 300)
-                    ]
-                elif room_filter == "🏰 超大型 (300間以上)":
-                    filtered_df = filtered_df[
-                        (filtered_df['房間數_清理'].notna()) & 
-                        (filtered_df['房間數_清理'] > 300)
-                    ]
-            except Exception as e:
-                st.warning(f"房間數篩選時發生問題，已跳過此篩選條件")
-        
-        # 為每個地點搜尋飯店
-        location_results = {}
+        # 所有地點同時進行地理編碼，完成一個就先記錄一個
+        location_coords = {}
         progress_bar = st.progress(0)
+        unique_places = list(dict.fromkeys(multi_places))
         
-        for i, location in enumerate(multi_places):
-            progress_bar.progress((i + 1) / len(multi_places))
-            coords, hotels = search_hotels_for_location(location, filtered_df, distance_range)
-            location_results[location] = (coords, hotels)
+        errors = {}
+        # 地點很多時每 1% 才更新一次進度條
+        progress_step = max(1, len(unique_places) // 100)
+        with stage_timer("geocode", "streamlit"):
+            geocoded = load_geocode_scheduler().geocode_many(unique_places)
+            for i, (location, loc, error) in enumerate(geocoded, 1):
+                if i % progress_step == 0 or i == len(unique_places):
+                    progress_bar.progress(i / len(unique_places))
+                if error is not None:
+                    errors.setdefault(str(error), []).append(location)
+                location_coords[location] = loc
+        # 相同的錯誤（例如網路中斷）只顯示一次
+        for message, failed in errors.items():
+            suffix = f"（{len(failed)} 個地點）" if len(failed) > 1 else ""
+            st.error(f"地理編碼時發生錯誤：{message}{suffix}")
+        
+        # 依輸入順序顯示，並以一次距離矩陣計算所有地點的搜尋結果（同一組地點與條件直接取自快取）
+        location_coords = {location: location_coords[location] for location in unique_places}
+        comparison_hits = search_hotels_for_locations(location_coords, filter_mask, distance_range,
+                                                      nearest_count, max_distance, ranking_weights,
+                                                      filter_key=filter_key)
+        hits_by_location = dict(tuple(comparison_hits.groupby('搜尋地點', sort=False)))
     
     progress_bar.empty()
     
     # 生成比較統計
-    stats_df = generate_comparison_stats(location_results)
+    stats_df = generate_comparison_stats(location_coords, comparison_hits)
     
     # 顯示比較結果
     if stats_df['飯店總數'].sum() > 0:
@@ -867,37 +1060,39 @@ elif compare_button and multi_places:
         st.markdown("### 📊 地點比較統計")
         
         # 美化的統計表格
-        st.dataframe(
-            stats_df,
-            use_container_width=True,
-            column_config={
-                "地點": st.column_config.TextColumn(
-                    "📍 地點",
-                    help="搜尋地點"
-                ),
-                "飯店總數": st.column_config.NumberColumn(
-                    "🏨 飯店總數",
-                    help="符合條件的飯店數量"
-                ),
-                "五星飯店": st.column_config.NumberColumn(
-                    "⭐ 五星飯店",
-                    help="五星級飯店數量"
-                ),
-                "溫泉飯店": st.column_config.NumberColumn(
-                    "♨️ 溫泉飯店",
-                    help="溫泉飯店數量"
-                ),
-                "平均距離": st.column_config.NumberColumn(
-                    "📏 平均距離(km)",
-                    help="飯店平均距離"
-                ),
-                "最近距離": st.column_config.NumberColumn(
-                    "🎯 最近距離(km)",
-                    help="最近飯店距離"
-                )
-            },
-            hide_index=True
-        )
+        stats_page = paginate(len(stats_df), STATS_PAGE_SIZE, "compare_stats_page")
+        with stage_timer("render", "streamlit"):
+            st.dataframe(
+                stats_df.iloc[stats_page],
+                use_container_width=True,
+                column_config={
+                    "地點": st.column_config.TextColumn(
+                        "📍 地點",
+                        help="搜尋地點"
+                    ),
+                    "飯店總數": st.column_config.NumberColumn(
+                        "🏨 飯店總數",
+                        help="符合條件的飯店數量"
+                    ),
+                    "五星飯店": st.column_config.NumberColumn(
+                        "⭐ 五星飯店",
+                        help="五星級飯店數量"
+                    ),
+                    "溫泉飯店": st.column_config.NumberColumn(
+                        "♨️ 溫泉飯店",
+                        help="溫泉飯店數量"
+                    ),
+                    "平均距離": st.column_config.NumberColumn(
+                        "📏 平均距離(km)",
+                        help="飯店平均距離"
+                    ),
+                    "最近距離": st.column_config.NumberColumn(
+                        "🎯 最近距離(km)",
+                        help="最近飯店距離"
+                    )
+                },
+                hide_index=True
+            )
         
         # 智能推薦
         st.markdown("### 🏆 智能推薦")
@@ -959,59 +1154,52 @@ elif compare_button and multi_places:
                 </div>
                 """, unsafe_allow_html=True)
         
+        # 飯店分布地圖（所有地點的搜尋結果，依結果範圍自動置中與縮放）
+        located = [(location, coords) for location, coords in location_coords.items() if coords]
+        st.markdown("### 🗺️ 飯店分布地圖")
+        # 同一間飯店可能在多個地點的範圍內，地圖上只畫一次
+        render_cluster_map(located, comparison_hits.drop_duplicates(subset=['飯店名稱', '地址']),
+                           "compare_map_zoom")
+        
         # 詳細結果展示
         st.markdown("### 📋 各地點詳細結果")
         
-        for location, (coords, hotels) in location_results.items():
-            if coords and hotels:
-                with st.expander(f"📍 {location} - {len(hotels)} 間飯店", expanded=False):
-                    df_location = pd.DataFrame(hotels)
-                    st.dataframe(
-                        df_location,
-                        use_container_width=True,
-                        column_config={
-                            "飯店名稱": st.column_config.TextColumn("🏨 飯店名稱"),
-                            "星級標章": st.column_config.TextColumn("⭐ 星級"),
-                            "地址": st.column_config.TextColumn("📍 地址"),
-                            "電話": st.column_config.TextColumn("📞 電話"),
-                            "房間數": st.column_config.NumberColumn("🏢 房間數"),
-                            "溫泉": st.column_config.TextColumn("♨️ 溫泉"),
-                            "距離(公里)": st.column_config.NumberColumn("📏 距離(km)")
-                        },
-                        hide_index=True
-                    )
-            elif coords:
-                st.info(f"📍 {location}：未找到符合條件的飯店")
-            else:
-                st.error(f"📍 {location}：地點定位失敗")
+        detail_page = paginate(len(location_coords), DETAIL_PAGE_SIZE, "compare_detail_page")
+        with stage_timer("render", "streamlit"):
+            for location, coords in list(location_coords.items())[detail_page]:
+                if coords and location in hits_by_location:
+                    df_location = hits_by_location[location].drop(columns='搜尋地點').reset_index(drop=True)
+                    with st.expander(f"📍 {location} - {len(df_location)} 間飯店", expanded=False):
+                        st.dataframe(
+                            df_location,
+                            use_container_width=True,
+                            column_config={
+                                "飯店名稱": st.column_config.TextColumn("🏨 飯店名稱"),
+                                "星級標章": st.column_config.TextColumn("⭐ 星級"),
+                                "地址": st.column_config.TextColumn("📍 地址"),
+                                "電話": st.column_config.TextColumn("📞 電話"),
+                                "房間數": st.column_config.NumberColumn("🏢 房間數"),
+                                "溫泉": st.column_config.TextColumn("♨️ 溫泉"),
+                                "距離(公里)": st.column_config.NumberColumn("📏 距離(km)"),
+                                "評分": st.column_config.NumberColumn("⚖️ 評分", format="%.1f")
+                            },
+                            hide_index=True
+                        )
+                elif coords:
+                    st.info(f"📍 {location}：未找到符合條件的飯店")
+                else:
+                    st.error(f"📍 {location}：地點定位失敗")
         
         # 合併下載功能
-        if any(hotels for coords, hotels in location_results.values()):
+        if len(comparison_hits):
             st.markdown("### 📥 下載比較結果")
             
-            # 合併所有結果
-            all_hotels = []
-            for location, (coords, hotels) in location_results.items():
-                for hotel in hotels:
-                    hotel_copy = hotel.copy()
-                    hotel_copy['搜尋地點'] = location
-                    all_hotels.append(hotel_copy)
-            
-            if all_hotels:
-                df_all = pd.DataFrame(all_hotels)
-                csv_data = df_all.to_csv(index=False, encoding='utf-8')
-                csv_with_bom = '\ufeff' + csv_data
-                
-                col1, col2, col3 = st.columns([1, 2, 1])
-                with col2:
-                    st.download_button(
-                        label="📥 下載完整比較結果 (CSV)",
-                        data=csv_with_bom.encode('utf-8'),
-                        file_name=f"多地點飯店比較_{len(multi_places)}地點_{len(all_hotels)}間飯店.csv",
-                        mime="text/csv; charset=utf-8",
-                        use_container_width=True,
-                        type="secondary"
-                    )
+            # 長表結果已包含所有地點與「搜尋地點」欄位，直接匯出
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col2:
+                render_download(comparison_hits,
+                                f"多地點飯店比較_{len(multi_places)}地點_{len(comparison_hits)}間飯店",
+                                "📥 下載完整比較結果", "compare_export_format")
     
     else:
         st.warning("😔 所有地點都沒有找到符合條件的星級飯店")
@@ -1057,4 +1245,12 @@ st.markdown("""
         </a>
     </p>
 </div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+
+# 效能偵錯面板放在腳本最後，才能包含本次搜尋的耗時
+if DEBUG_PANEL:
+    with st.sidebar.expander("🛠️ 效能統計（各階段耗時）", expanded=False):
+        st.dataframe(pd.DataFrame(METRICS.summary()), use_container_width=True, hide_index=True)
+    if dataset is not None and len(dataset.quarantine):
+        with st.sidebar.expander(f"🚧 隔離的資料列（{len(dataset.quarantine)} 筆）", expanded=False):
+            st.dataframe(dataset.quarantine, use_container_width=True, hide_index=True)
@@ -0,0 +1,184 @@
+"""旅宿名稱、地址的字元 n-gram 反向索引（輸入即搜尋）
+
+載入資料時一次建立：旅宿名稱、地址分別正規化（全形轉半形、統一「臺/台」、轉小寫、去除空白）後，
+以 NumPy 把所有文字的 Unicode 碼位串成一個陣列，一次產生每一列的單字（unigram）與雙字（bigram）鍵，
+排序去重後存成 CSR 形式的倒排表（鍵 → 依列序排序的資料列位置）。
+
+查詢時：
+- 單一字元的詞查 unigram 倒排表；兩個字元以上取詞中所有 bigram 的倒排表交集（由最短的開始），
+  只有三個字元以上才需要對交集後的少數候選確認整個詞確實連續出現
+- 以空白分隔的多個詞都必須出現（各詞可出現在名稱或地址）
+- 可傳入篩選遮罩（例如星級、溫泉）與候選取交集
+- 排序：名稱完全相同 > 名稱開頭相同 > 名稱包含 > 只有地址包含，同分時名稱較短者優先
+"""
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from hotel_finder_geocode import normalize_address
+
+TEXT_COLUMNS = ('旅宿名稱', '地址')
+MAX_TEXT_RESULTS = 20
+
+# 名稱與地址的比對分數
+SCORE_NAME_EXACT = 8.0
+SCORE_NAME_PREFIX = 4.0
+SCORE_NAME = 2.0
+SCORE_ADDRESS = 1.0
+
+# Unicode 碼位最多 21 位元，bigram 鍵為 (前一字 << 21) | 後一字；unigram 鍵的後一字為 0
+_CODE_BITS = 21
+# 建立索引時把 (鍵, 列) 合成一個 int64 排序去重，列數需小於 2^21；更多列時改用 lexsort
+_ROW_BITS = 63 - 2 * _CODE_BITS
+
+
+def normalize_text(text):
+    """查詢字串與索引文字使用相同的正規化，並去除所有空白"""
+    return normalize_address(text).replace(" ", "")
+
+
+def _normalize_column(values):
+    """整欄串成一個字串一次正規化，再依分隔字元切回各列（\x00 不是空白，也不會與前後字元合併）"""
+    text = pd.Series(values).astype(object).fillna("").astype(str)
+    joined = unicodedata.normalize("NFKC", "\x00".join(text.str.replace("\x00", "", regex=False)))
+    joined = re.sub(r"\s+", "", joined.replace("臺", "台").lower())
+    return np.array(joined.split("\x00") if len(text) else [], dtype=object)
+
+
+def _gram_key(text):
+    codes = [ord(ch) for ch in text]
+    if len(codes) == 1:
+        return [codes[0] << _CODE_BITS]
+    return [(a << _CODE_BITS) | b for a, b in zip(codes, codes[1:])]
+
+
+class GramPostings:
+    """單一欄位的 unigram / bigram 倒排表（CSR）"""
+
+    def __init__(self, texts):
+        self.texts = texts
+        lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+        joined = "".join(texts)
+        codes = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+        rows = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+
+        # 每列開頭兩個字的鍵（與 _gram_key 相同編碼），用來判斷是否以查詢詞開頭
+        starts = np.cumsum(lengths) - lengths
+        padded = np.append(codes, [0, 0])
+        first = np.where(lengths > 0, padded[starts], 0)
+        second = np.where(lengths > 1, padded[starts + 1], 0)
+        self.heads = (first << _CODE_BITS) | second
+
+        # 同一列內相鄰兩字組成 bigram（不跨列）
+        same_row = rows[1:] == rows[:-1] if len(rows) else np.empty(0, dtype=bool)
+        bigrams = ((codes[:-1] << _CODE_BITS) | codes[1:])[same_row]
+        keys = np.concatenate([codes << _CODE_BITS, bigrams])
+        owners = np.concatenate([rows, rows[:-1][same_row]])
+
+        # 依 (鍵, 列) 排序並去除同一列重複的鍵
+        if len(texts) < 1 << _ROW_BITS:
+            packed = np.sort((keys << _ROW_BITS) | owners)
+            packed = packed[np.concatenate([[True], packed[1:] != packed[:-1]])] if len(packed) else packed
+            keys, owners = packed >> _ROW_BITS, packed & ((1 << _ROW_BITS) - 1)
+        else:
+            order = np.lexsort((owners, keys))
+            keys, owners = keys[order], owners[order]
+            if len(keys):
+                distinct = np.concatenate([[True], (keys[1:] != keys[:-1]) | (owners[1:] != owners[:-1])])
+                keys, owners = keys[distinct], owners[distinct]
+        # 鍵已排序：每個鍵的第一筆即為倒排表起點
+        self.starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]])) if len(keys) \
+            else np.empty(0, dtype=np.int64)
+        self.keys = keys[self.starts]
+        self.ends = np.append(self.starts[1:], len(keys))
+        self.rows = owners.astype(np.int32)
+
+    def posting(self, key):
+        i = np.searchsorted(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return self.rows[:0]
+        return self.rows[self.starts[i]:self.ends[i]]
+
+    def startswith(self, rows, term):
+        """rows 中以 term（已正規化）開頭的布林遮罩"""
+        head = _gram_key(term[:2])[0]
+        if len(term) == 1:
+            return (self.heads[rows] >> _CODE_BITS) == (head >> _CODE_BITS)
+        matched = self.heads[rows] == head
+        if len(term) > 2:
+            candidates = np.flatnonzero(matched)
+            matched[candidates] = np.fromiter((text.startswith(term) for text in self.texts[rows[candidates]]),
+                                              dtype=bool, count=len(candidates))
+        return matched
+
+    def lookup(self, term):
+        """包含 term（已正規化）的資料列位置（已排序）"""
+        postings = sorted((self.posting(key) for key in set(_gram_key(term))), key=len)
+        hits = postings[0]
+        for posting in postings[1:]:
+            if not len(hits):
+                break
+            hits = np.intersect1d(hits, posting, assume_unique=True)
+        if len(term) > 2 and len(hits):
+            # bigram 都出現不代表連續出現，確認交集後的少數候選
+            keep = np.fromiter((term in text for text in self.texts[hits]), dtype=bool, count=len(hits))
+            hits = hits[keep]
+        return hits
+
+
+class TextIndex:
+    """旅宿名稱與地址的 n-gram 索引，建立一次後唯讀共用"""
+
+    def __init__(self, df):
+        self.size = len(df)
+        self.names = GramPostings(_normalize_column(df[TEXT_COLUMNS[0]]))
+        self.addresses = GramPostings(_normalize_column(df[TEXT_COLUMNS[1]]))
+        self.name_lengths = np.fromiter((len(name) for name in self.names.texts),
+                                        dtype=np.int64, count=self.size)
+
+    def search(self, query, mask=None, limit=MAX_TEXT_RESULTS):
+        """回傳 (positions, scores)：依分數由高到低、名稱由短到長排列，最多 limit 筆
+
+        mask 為篩選遮罩（長度等於資料筆數），只保留遮罩為 True 的飯店。
+        """
+        terms = [normalize_text(term) for term in str(query).split()]
+        terms = [term for term in terms if term]
+        empty = np.empty(0, dtype=np.int64), np.empty(0)
+        if not terms:
+            return empty
+
+        candidates, scores = None, None
+        for term in terms:
+            name_hits = self.names.lookup(term)
+            address_hits = self.addresses.lookup(term)
+            hits = np.union1d(name_hits, address_hits)
+            if candidates is not None:
+                hits = np.intersect1d(candidates, hits, assume_unique=True)
+            if mask is not None:
+                hits = hits[mask[hits]]
+            if not len(hits):
+                return empty
+            in_name = np.isin(hits, name_hits, assume_unique=True)
+            term_scores = np.where(in_name, SCORE_NAME, 0.0)
+            term_scores += np.where(np.isin(hits, address_hits, assume_unique=True), SCORE_ADDRESS, 0.0)
+            if len(terms) == 1 and in_name.any():
+                # 只有名稱包含查詢詞的候選才需比較開頭與全名
+                named = np.flatnonzero(in_name)
+                prefix = self.names.startswith(hits[named], term)
+                exact = self.name_lengths[hits[named]] == len(term)
+                term_scores[named] += np.select([prefix & exact, prefix],
+                                                [SCORE_NAME_EXACT - SCORE_NAME, SCORE_NAME_PREFIX - SCORE_NAME], 0.0)
+            if candidates is None:
+                candidates, scores = hits, term_scores
+            else:
+                scores = scores[np.isin(candidates, hits, assume_unique=True)] + term_scores
+                candidates = hits
+        if limit is not None and limit < len(candidates):
+            # 只需前 limit 名：先部分選取分數門檻，再排序門檻以上的候選
+            threshold = np.partition(scores, len(scores) - limit)[len(scores) - limit]
+            keep = scores >= threshold
+            candidates, scores = candidates[keep], scores[keep]
+        order = np.lexsort((candidates, self.name_lengths[candidates], -scores))[:limit]
+        return candidates[order].astype(np.int64), scores[order]
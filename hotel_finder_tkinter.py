@@ -1,65 +1,111 @@
 import tkinter as tk
 from tkinter import messagebox, ttk
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from geopy.geocoders import Nominatim
-from geopy.distance import geodesic
 import os
 
+from hotel_finder_dataset import HotelDataset, artifact_path_for
+from hotel_finder_geocode import (
+    GeocodeCache, Geocoder, RateLimiter, load_gazetteer, nominatim_resolver, rate_limited,
+)
+from hotel_finder_metrics import stage_timer
+
 CSV_FILE = r"C:\hotel_finder_local\hotel_with_latlng.csv"  # 本機檔案路徑
+SEARCH_RADIUS_KM = 10
+POLL_INTERVAL_MS = 50
 
 def download_hotel_data():
-    if not os.path.exists(CSV_FILE):
-        messagebox.showerror("找不到飯店資料檔案！", f"請確認 {CSV_FILE} 存在")
-        return None
-    df = pd.read_csv(CSV_FILE, encoding="utf-8")
-    return df
+    """載入飯店資料集（含星級篩選遮罩與空間索引），啟動時只執行一次"""
+    if not os.path.exists(CSV_FILE) and not os.path.exists(artifact_path_for(CSV_FILE)):
+        raise FileNotFoundError(CSV_FILE)
+    with stage_timer("load", "tkinter"):
+        return HotelDataset.from_csv(CSV_FILE)
+
+# 線上查詢與 Streamlit、API 版相同：加上「, Taiwan」限定在台灣（共用同一個快取，查詢方式必須一致），
+# 並透過節流器限制每秒請求數（Nominatim 使用政策為每秒 1 次）
+geocoder = Geocoder(
+    load_gazetteer(),
+    GeocodeCache(),
+    rate_limited(nominatim_resolver(Nominatim(user_agent="hotel_finder_gui"), suffix=", Taiwan"),
+                 RateLimiter()),
+)
+
+# 本次執行查過的地點，重複查詢不必再讀取磁碟上的快取
+recent_locations = {}
 
 def get_location_latlng(address):
-    geolocator = Nominatim(user_agent="hotel_finder_gui")
-    location = geolocator.geocode(address)
-    if location:
-        return (location.latitude, location.longitude)
-    else:
-        return None
+    loc = recent_locations.get(address)
+    if loc is None:
+        with stage_timer("geocode", "tkinter"):
+            loc = geocoder.geocode(address)
+        if loc is not None:
+            recent_locations[address] = loc
+    return loc
 
-def filter_star_hotels(df):
-    return df[df['標章'].astype(str).str.contains("星級", na=False)]
+def search_hotels(place):
+    """在背景執行緒中執行：地理編碼與距離計算，不碰任何 Tk 元件"""
+    dataset = dataset_future.result()  # 等待啟動時的資料載入完成
+    loc = get_location_latlng(place)
+    if loc is None:
+        return None
+    with stage_timer("distance", "tkinter"):
+        positions, distances = dataset.spatial.query_radius(
+            loc, SEARCH_RADIUS_KM, dataset.filters.star_hotel)
+    hits = dataset.frame.iloc[positions]
+    return [
+        [name, mark, addr, f"{distance:.2f}"]
+        for name, mark, addr, distance in zip(
+            hits['旅宿名稱'], hits['標章'], hits['地址'], distances)
+    ]
 
 def clear_tree():
     for item in tree.get_children():
         tree.delete(item)
 
 def query():
+    """送出查詢到背景執行緒；較新的查詢會取代尚未完成的舊查詢"""
+    global query_generation, pending_query
     place = entry.get()
-    loc = get_location_latlng(place)
-    if loc is None:
-        messagebox.showerror("查無此地點", "請輸入正確地點")
+    query_generation += 1
+    if pending_query is not None:
+        pending_query.cancel()  # 尚未開始執行的舊查詢直接取消
+    pending_query = executor.submit(search_hotels, place)
+    status.set(f"查詢中：{place}")
+    root.after(POLL_INTERVAL_MS, poll_query, pending_query, query_generation)
+
+def poll_query(future, generation):
+    """在 Tk 主執行緒中以 root.after 輪詢查詢結果"""
+    if generation != query_generation:
+        return  # 已被較新的查詢取代
+    if not future.done():
+        root.after(POLL_INTERVAL_MS, poll_query, future, generation)
+        return
+    status.set("")
+    error = future.exception()
+    if isinstance(error, FileNotFoundError):
+        messagebox.showerror("找不到飯店資料檔案！", f"請確認 {CSV_FILE} 存在")
+        return
+    if error is not None:
+        messagebox.showerror("查詢失敗", str(error))
         return
-    df = download_hotel_data()
-    if df is None:
+    hotels = future.result()
+    if hotels is None:
+        messagebox.showerror("查無此地點", "請輸入正確地點")
         return
-    df = filter_star_hotels(df)
-    hotels = []
-    for _, row in df.iterrows():
-        try:
-            hotel_loc = (float(row['lat']), float(row['lng']))
-            distance = geodesic(loc, hotel_loc).km
-            if distance <= 10:
-                hotels.append([
-                    row['旅宿名稱'],
-                    row['標章'],
-                    row['地址'],
-                    f"{distance:.2f}"
-                ])
-        except:
-            continue
-    hotels = sorted(hotels, key=lambda x: float(x[3]))
-    clear_tree()
     if not hotels:
+        clear_tree()
         messagebox.showinfo("查詢結果", "查無10公里內星級飯店")
         return
-    for h in hotels:
-        tree.insert('', tk.END, values=h)
+    with stage_timer("render", "tkinter"):
+        clear_tree()
+        for h in hotels:
+            tree.insert('', tk.END, values=h)
+
+# 啟動時在背景載入資料，之後的查詢都直接使用記憶體中的資料集
+executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hotel_query")
+dataset_future = executor.submit(download_hotel_data)
+query_generation = 0
+pending_query = None
 
 root = tk.Tk()
 root.title("台灣星級飯店地理查詢 (tkinter表格版)")
@@ -71,6 +117,9 @@ entry.pack(pady=5)
 
 tk.Button(root, text="查詢", command=query).pack(pady=5)
 
+status = tk.StringVar()
+tk.Label(root, textvariable=status, fg="gray").pack()
+
 # 建立表格
 columns = ("旅宿名稱", "星級標章", "地址", "距離(km)")
 tree = ttk.Treeview(root, columns=columns, show="headings", height=20)
@@ -79,4 +128,5 @@ for col in columns:
     tree.column(col, width=200 if col != "地址" else 350, anchor="w")
 tree.pack(fill="both", expand=True, padx=10, pady=10)
 
-root.mainloop()
\ No newline at end of file
+root.mainloop()
+executor.shutdown(wait=False, cancel_futures=True)
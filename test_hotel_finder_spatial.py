@@ -0,0 +1,117 @@
+"""GridIndex、SortedDistances 與全表掃描（逐點 geodesic）的結果比對
+
+    python -m pytest -q test_hotel_finder_spatial.py
+"""
+import numpy as np
+import pytest
+from geopy.distance import geodesic
+
+from hotel_finder_spatial import GridIndex, SortedDistances
+
+QUERY_POINTS = [(25.0478, 121.5170), (22.6394, 120.3025), (23.9769, 121.6044), (24.5, 119.5)]
+
+
+@pytest.fixture(scope="module")
+def hotels():
+    """台灣範圍內的隨機座標（含無效座標）與篩選遮罩"""
+    rng = np.random.default_rng(0)
+    size = 1500
+    lats = rng.uniform(21.9, 25.3, size)
+    lngs = rng.uniform(119.9, 122.0, size)
+    lats[::97] = np.nan
+    allowed = rng.random(size) < 0.6
+    return lats, lngs, allowed
+
+
+@pytest.fixture(scope="module")
+def brute_force(hotels):
+    """每個查詢點逐點以 geodesic 計算的距離（無效座標為 inf）"""
+    lats, lngs, _ = hotels
+    return {
+        origin: np.array([
+            geodesic(origin, (lat, lng)).km if np.isfinite(lat) and np.isfinite(lng) else np.inf
+            for lat, lng in zip(lats, lngs)
+        ])
+        for origin in QUERY_POINTS
+    }
+
+
+@pytest.mark.parametrize("origin", QUERY_POINTS)
+@pytest.mark.parametrize("radius_km", [3, 10, 30])
+@pytest.mark.parametrize("filtered", [False, True])
+def test_query_radius_matches_brute_force(hotels, brute_force, origin, radius_km, filtered):
+    lats, lngs, allowed = hotels
+    mask = allowed if filtered else np.ones(len(lats), dtype=bool)
+    positions, distances = GridIndex(lats, lngs).query_radius(origin, radius_km, allowed if filtered else None)
+
+    expected = brute_force[origin]
+    inside = np.flatnonzero((expected <= radius_km) & mask)
+    assert sorted(positions) == sorted(inside)
+    # 距離為 haversine，只有半徑邊界帶內改用 geodesic，誤差在 0.5% 以內
+    np.testing.assert_allclose(distances, expected[positions], rtol=0.005)
+    assert np.all(np.diff(np.round(distances, 2)) >= 0)
+
+
+@pytest.mark.parametrize("origin", QUERY_POINTS)
+@pytest.mark.parametrize("k", [1, 10, 50])
+@pytest.mark.parametrize("filtered", [False, True])
+def test_query_nearest_matches_brute_force(hotels, brute_force, origin, k, filtered):
+    lats, lngs, allowed = hotels
+    mask = allowed if filtered else np.ones(len(lats), dtype=bool)
+    positions, distances = GridIndex(lats, lngs).query_nearest(origin, k, allowed if filtered else None)
+
+    expected = np.where(mask, brute_force[origin], np.inf)
+    kth = np.sort(expected)[k - 1]
+    assert len(positions) == k
+    assert np.all(mask[positions])
+    # haversine 與 geodesic 的排序可能在距離極接近時互換，因此以第 k 近距離（含誤差）比較
+    assert np.all(expected[positions] <= kth * 1.005)
+    assert np.all(np.diff(np.round(distances, 2)) >= 0)
+
+
+def test_query_nearest_respects_max_km(hotels, brute_force):
+    lats, lngs, _ = hotels
+    origin = QUERY_POINTS[0]
+    positions, distances = GridIndex(lats, lngs).query_nearest(origin, 500, max_km=8)
+
+    expected = brute_force[origin]
+    assert sorted(positions) == sorted(np.flatnonzero(expected <= 8))
+    assert np.all(distances <= 8)
+
+
+@pytest.mark.parametrize("origin", QUERY_POINTS)
+@pytest.mark.parametrize("filtered", [False, True])
+def test_sorted_distances_matches_grid_index(hotels, brute_force, origin, filtered):
+    lats, lngs, allowed = hotels
+    mask = allowed if filtered else None
+    grid = GridIndex(lats, lngs)
+    ranking = SortedDistances(origin, lats, lngs)
+    assert ranking.order.dtype == np.int32 and ranking.distances.dtype == np.float32
+
+    for radius_km in (3, 10, 30):
+        for refine in (True, False):
+            positions, distances = ranking.query_radius(radius_km, mask, refine=refine)
+            expected_positions, expected_distances = grid.query_radius(origin, radius_km, mask, refine=refine)
+            # 兩種查詢應逐位元相同（距離與依四捨五入距離決定的順序），不只是誤差內相近
+            np.testing.assert_array_equal(positions, expected_positions)
+            np.testing.assert_array_equal(distances, expected_distances)
+
+    positions, _ = ranking.query_nearest(10, mask)
+    expected = np.where(allowed if filtered else True, brute_force[origin], np.inf)
+    assert np.all(expected[positions] <= np.sort(expected)[9] * 1.005)
+
+
+def test_sorted_distances_matches_grid_index_on_float32_coordinates():
+    """資料集座標以 float32 儲存；距離接近 x.xx5 公里的飯店在兩種查詢的排序與顯示距離必須相同"""
+    rng = np.random.default_rng(1)
+    lats = rng.uniform(21.9, 25.3, 20000).astype(np.float32)
+    lngs = rng.uniform(119.9, 122.0, 20000).astype(np.float32)
+    grid = GridIndex(lats, lngs)
+    for _ in range(20):
+        origin = (float(rng.uniform(22.0, 25.0)), float(rng.uniform(120.0, 121.8)))
+        ranking = SortedDistances(origin, lats, lngs)
+        for radius_km in (5, 20):
+            positions, distances = ranking.query_radius(radius_km)
+            expected_positions, expected_distances = grid.query_radius(origin, radius_km)
+            np.testing.assert_array_equal(positions, expected_positions)
+            np.testing.assert_array_equal(distances, expected_distances)